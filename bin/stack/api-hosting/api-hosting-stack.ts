@@ -116,6 +116,15 @@ export class APIHostingStack extends BaseStack {
         });
     }
 
+    private getVariants(): any[] {
+        // latency-aware routing sends each request to one of these variants(TargetVariant)
+        const modelList: any[] = this.commonProps.appConfig.Stack.ModelServing.ModelList;
+        return modelList.map(model => ({
+            VariantName: model.VariantName,
+            VariantWeight: model.VariantWeight
+        }));
+    }
+
     private createPredictLambdaFunction(props: PredictLambdaProps) {
         const baseName = `${props.name}-Lambda`;
         const fullName = `${this.projectPrefix}-${baseName}`;
@@ -130,16 +139,40 @@ export class APIHostingStack extends BaseStack {
         role.addManagedPolicy({ managedPolicyArn: 'arn:aws:iam::aws:policy/AmazonSageMakerFullAccess' });
         role.addManagedPolicy({ managedPolicyArn: 'arn:aws:iam::aws:policy/AmazonKinesisFullAccess' });
 
+        // python modules shared with the inference container, e.g. phase_timer.py and log_setup.py
+        const commonLayer = new lambda.LayerVersion(this, `${baseName}-CommonLayer`, {
+            code: lambda.Code.fromAsset('codes/common'),
+            compatibleRuntimes: [lambda.Runtime.PYTHON_3_7],
+            description: 'modules in codes/common/python'
+        });
+
         const lambdaFunction = new lambda.Function(this, baseName, {
             functionName: fullName,
             code: lambda.Code.fromAsset(lambdaPath),
             handler: 'handler.handle',
             runtime: lambda.Runtime.PYTHON_3_7,
+            layers: [commonLayer],
             timeout: cdk.Duration.seconds(60 * 5),
             memorySize: 1024,
             role: role,
             environment: {
                 SAGEMAKER_ENDPOINT: props.endpointName,
+                CACHE_ENABLE: String(this.stackConfig.ResponseCacheEnable ?? false),
+                CACHE_MAX_ENTRIES: String(this.stackConfig.ResponseCacheMaxEntries ?? 1024),
+                CACHE_TTL_IN_SEC: String(this.stackConfig.ResponseCacheTTLInSec ?? 60),
+                WARMUP_ON_INIT: String(this.stackConfig.WarmUpOnInit ?? true),
+                WARMUP_INVOKE: String(this.stackConfig.WarmUpInvoke ?? false),
+                TIMING_SAMPLE_RATE: String(this.stackConfig.TimingSampleRate ?? 0.1),
+                RETURN_TIMINGS: String(this.stackConfig.ReturnTimings ?? false),
+                LOG_SAMPLE_RATE: String(this.stackConfig.LogSampleRate ?? 0.01),
+                LOG_VERBOSE: String(this.stackConfig.LogVerbose ?? false),
+                HEDGE_ENABLE: String(this.stackConfig.HedgeEnable ?? false),
+                HEDGE_PERCENTILE: String(this.stackConfig.HedgePercentile ?? 95),
+                HEDGE_BUDGET_RATIO: String(this.stackConfig.HedgeBudgetRatio ?? 0.1),
+                MAX_TIMEOUT_IN_MS: String(this.stackConfig.MaxTimeoutInMs ?? 10000),
+                ROUTING_ENABLE: String(this.stackConfig.RoutingEnable ?? false),
+                ROUTING_EPSILON: String(this.stackConfig.RoutingEpsilon ?? 0.05),
+                VARIANTS: JSON.stringify(this.getVariants()),
             },
             currentVersionOptions: {
                 removalPolicy: cdk.RemovalPolicy.RETAIN,
@@ -26,8 +26,12 @@ import { BaseStack, StackCommonProps } from '../../../lib/base/base-stack'
 
 interface LambdaProps {
     name: string;
+    clientIndex: number;
     apiEndpoint: string;
+    dataCaptureUri: string;
+    endpointName: string;
     role: iam.Role;
+    commonLayer: lambda.ILayerVersion;
     testDurationInSec: number,
     testIntervalInSec: number,
     snsTopic: sns.Topic
@@ -43,11 +47,25 @@ export class APITestingStack extends BaseStack {
 
         const role = this.createLambdaRole('TestTrigger-Lambda');
         const apiEndpoint: string = this.getParameter('apiEndpoint');
+        // python modules shared with the other functions, e.g. log_setup.py
+        const commonLayer = new lambda.LayerVersion(this, 'TestTrigger-CommonLayer', {
+            code: lambda.Code.fromAsset('codes/common'),
+            compatibleRuntimes: [lambda.Runtime.PYTHON_3_7],
+            description: 'modules in codes/common/python'
+        });
+        const dataCaptureUri: string = this.getParameter('dataCaptureUri');
+        role.addToPolicy(this.getDataCaptureReadPolicy(this.getParameter('dataCaptureBucketName')));
+        const endpointName: string = this.getParameter('sageMakerEndpointName');
+        role.addToPolicy(this.getEndpointInvokePolicy());
         for (let index = 0; index < this.stackConfig.TestClientCount; index++) {
             this.createLambdaFunction({
                 name: `${this.stackConfig.LambdaFunctionName}${String(index + 1).padStart(3, '0')}`,
+                clientIndex: index,
                 apiEndpoint: apiEndpoint,
+                dataCaptureUri: dataCaptureUri,
+                endpointName: endpointName,
                 role: role,
+                commonLayer: commonLayer,
                 testDurationInSec: this.stackConfig.TestDurationInSec,
                 testIntervalInSec: this.stackConfig.TestIntervalInSec,
                 snsTopic: snsTopic
@@ -78,6 +96,40 @@ export class APITestingStack extends BaseStack {
         return role;
     }
 
+    private getVariants(): any[] {
+        // CapacitySearch mode turns the endpoint capacity into a target for each variant
+        const modelList: any[] = this.commonProps.appConfig.Stack.ModelServing.ModelList;
+        return modelList.map(model => ({
+            VariantName: model.VariantName,
+            VariantWeight: model.VariantWeight,
+            InstanceCount: model.InstanceCount
+        }));
+    }
+
+    private getEndpointInvokePolicy(): iam.PolicyStatement {
+        // VariantComparison mode invokes each variant of the endpoint directly
+        const statement = new iam.PolicyStatement();
+        statement.addActions(
+            "sagemaker:InvokeEndpoint"
+        );
+        // endpoint ARNs are lower case, which a resolved-at-deploy name can not be converted into
+        statement.addResources(`arn:aws:sagemaker:${this.region}:${this.account}:endpoint/*`);
+
+        return statement;
+    }
+
+    private getDataCaptureReadPolicy(bucketName: string): iam.PolicyStatement {
+        // Replay mode streams the data capture files of the endpoint
+        const statement = new iam.PolicyStatement();
+        statement.addActions(
+            "s3:GetObject",
+            "s3:ListBucket"
+        );
+        statement.addResources(`arn:aws:s3:::${bucketName}`, `arn:aws:s3:::${bucketName}/*`);
+
+        return statement;
+    }
+
     private createLambdaFunction(props: LambdaProps): lambda.Function {
         const baseName = `${props.name}-Lambda`;
         const fullName = `${this.projectPrefix}-${baseName}`;
@@ -92,9 +144,15 @@ export class APITestingStack extends BaseStack {
             timeout: cdk.Duration.minutes(15), // MAX 15 minutes
             memorySize: 256,
             role: props.role,
+            layers: [props.commonLayer],
             retryAttempts: 0,
             environment: {
                 API_ENDPOINT: props.apiEndpoint,
+                // every client receives the test message, single-client modes run only on the first one
+                TEST_CLIENT_INDEX: String(props.clientIndex),
+                DATA_CAPTURE_URI: props.dataCaptureUri,
+                VARIANTS: JSON.stringify(this.getVariants()),
+                SAGEMAKER_ENDPOINT: props.endpointName,
                 PROJECT_NAME: this.commonProps.appConfig.Project.Name,
                 PROJECT_STAGE: this.commonProps.appConfig.Project.Stage,
             }
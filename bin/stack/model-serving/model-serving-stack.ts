@@ -30,6 +30,7 @@ interface ModelProps {
     modelS3Key: string;
     modelDockerImage: string;
     modelServerWorkers: string;
+    modelEnvironment?: { [key: string]: string };
 }
 
 interface VariantConfigProps {
@@ -82,7 +83,8 @@ export class ModelServingStack extends BaseStack {
                 modelS3Key: model.ModelS3Key,
                 modelBucketName: modelBucketName,
                 role: role,
-                modelServerWorkers: model.ModelServerWorkers
+                modelServerWorkers: model.ModelServerWorkers,
+                modelEnvironment: model.ModelEnvironment
             });
 
             modelConfigList.push({
@@ -95,6 +97,8 @@ export class ModelServingStack extends BaseStack {
         }
 
         const loggingBucketName = this.createS3Bucket(stackConfig.BucketBaseName).bucketName;
+        this.putParameter('dataCaptureBucketName', loggingBucketName);
+        this.putParameter('dataCaptureUri', `s3://${loggingBucketName}/${stackConfig.DataLoggingS3Key}`);
         const endpointConfigName = this.createEndpointConfig({
             endpointConfigName: stackConfig.EndpointConfigName,
             variantConfigPropsList: modelConfigList,
@@ -137,6 +141,7 @@ export class ModelServingStack extends BaseStack {
                     image: props.modelDockerImage,
                     modelDataUrl: `s3://${props.modelBucketName}/${props.modelS3Key}/model.tar.gz`,
                     environment: {
+                        ...props.modelEnvironment,
                         SAGEMAKER_MODEL_SERVER_WORKERS: props.modelServerWorkers
                     }
                 }
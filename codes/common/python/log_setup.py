@@ -0,0 +1,161 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Non-blocking logging for the request hot paths of the Lambda functions and the inference container.
+
+Records go through a bounded queue to one listener thread, which writes them to stdout, so a
+request never waits for log I/O. Below WARNING, records are kept only for sampled requests
+(begin_request()) and long messages are truncated. WARNING and above are always logged in full,
+and ERROR records are never dropped even when the queue is full. set_verbose() switches every
+configured logger to DEBUG without sampling at runtime.
+"""
+
+import sys
+import time
+import queue
+import random
+import logging
+import threading
+import logging.handlers
+
+_sample_rate = 1.0
+_verbose = False
+_max_length = 2000
+
+_queue = None
+_listener = None
+_loggers = []
+_dropped = 0
+_local = threading.local()
+_lock = threading.Lock()
+
+# extra= for INFO records which are kept regardless of sampling, e.g. one summary line per test
+ALWAYS = {'always_log': True}
+
+
+class _SamplingFilter(logging.Filter):
+
+    def filter(self, record):
+        if _verbose or record.levelno >= logging.WARNING or getattr(record, 'always_log', False):
+            return True
+        return is_sampled()
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        if record.levelno < logging.WARNING and len(record.msg) > _max_length:
+            record.msg = '{}...(truncated {} chars)'.format(record.msg[:_max_length], len(record.msg) - _max_length)
+        return record
+
+
+    def enqueue(self, record):
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.ERROR:
+                self.queue.put(record)
+            else:
+                _dropped += 1
+
+
+def setup_logging(logger=None, sample_rate=1.0, max_length=2000, verbose=False, queue_size=10000, stream=None):
+    """Routes logger(default: root) through the shared queue; returns the logger."""
+    global _queue, _listener, _sample_rate, _max_length
+    if logger is None:
+        logger = logging.getLogger()
+
+    with _lock:
+        if _listener is None:
+            _queue = queue.Queue(queue_size)
+            _listener = logging.handlers.QueueListener(_queue, logging.StreamHandler(stream if stream is not None else sys.stdout))
+            _listener.start()
+        _sample_rate = sample_rate
+        _max_length = max_length
+
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        handler = _NonBlockingQueueHandler(_queue)
+        handler.addFilter(_SamplingFilter())
+        logger.addHandler(handler)
+        if logger is not logging.getLogger():
+            logger.propagate = False
+        if logger not in _loggers:
+            _loggers.append(logger)
+
+    set_verbose(verbose)
+    return logger
+
+
+def set_verbose(verbose):
+    global _verbose
+    _verbose = verbose
+    for logger in _loggers:
+        logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+
+def set_sample_rate(sample_rate):
+    global _sample_rate
+    _sample_rate = sample_rate
+
+
+def begin_request(sampled=None):
+    """Decides whether INFO records of the request on this thread are kept."""
+    _local.sampled = sampled if sampled is not None else random.random() < _sample_rate
+    return _local.sampled
+
+
+def is_sampled():
+    return getattr(_local, 'sampled', True)
+
+
+def get_dropped_count():
+    return _dropped
+
+
+def flush(timeout_in_sec=1.0):
+    """Waits until the listener wrote every queued record, e.g. before a Lambda invocation returns."""
+    if _queue is None:
+        return True
+
+    deadline = time.monotonic() + timeout_in_sec
+    with _queue.all_tasks_done:
+        while _queue.unfinished_tasks > 0:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            _queue.all_tasks_done.wait(remaining)
+    return True
+
+
+def stop():
+    """Writes the queued records and stops the listener thread; setup_logging() starts a new one."""
+    global _queue, _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        for logger in _loggers:
+            for handler in list(logger.handlers):
+                if isinstance(handler, _NonBlockingQueueHandler):
+                    logger.removeHandler(handler)
+        del _loggers[:]
+        _queue = None
+        _listener = None
@@ -0,0 +1,196 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Per-request phase timing, shared by the Lambda functions(through a Lambda layer) and the
+inference container(copied into code/ by script/pack_models.sh).
+
+A collector decides per request whether it is sampled. Unsampled requests get NULL_TIMER,
+whose spans cost only a method call. Sampled timings are written as one CloudWatch embedded
+metric format(EMF) log line, so no CloudWatch API call is made on the request path.
+"""
+
+import sys
+import json
+import time
+import random
+
+
+class _NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class _Span(object):
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+
+    def __enter__(self):
+        self.start = self.timer.clock()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timer.add(self.name, (self.timer.clock() - self.start) * 1000)
+        return False
+
+
+class PhaseTimer(object):
+    """Accumulates milliseconds per phase name; a phase entered several times is summed.
+
+    Event counts of the request(e.g. hedged requests) are kept next to the timings.
+    """
+
+    def __init__(self, sampled=True, clock=time.perf_counter):
+        self.sampled = sampled
+        self.clock = clock
+        self.timings = {}
+        self.counts = {}
+
+
+    def span(self, name):
+        return _Span(self, name)
+
+
+    def add(self, name, value_in_ms):
+        self.timings[name] = self.timings.get(name, 0.0) + value_in_ms
+
+
+    def count(self, name, value=1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+
+    def get(self, name, default=None):
+        return self.timings.get(name, default)
+
+
+    def to_dict(self, precision=3):
+        return {name: round(value, precision) for name, value in self.timings.items()}
+
+
+class _NullTimer(object):
+    sampled = False
+    timings = {}
+    counts = {}
+    _span = _NullSpan()
+
+    def span(self, name):
+        return self._span
+
+
+    def add(self, name, value_in_ms):
+        pass
+
+
+    def count(self, name, value=1):
+        pass
+
+
+    def get(self, name, default=None):
+        return default
+
+
+    def to_dict(self, precision=3):
+        return {}
+
+
+NULL_TIMER = _NullTimer()
+
+
+class MetricCollector(object):
+
+    def __init__(self, sample_rate=1.0, random_func=random.random):
+        self.sample_rate = sample_rate
+        self.random_func = random_func
+
+
+    def start(self, force=False):
+        """Returns a timer for one request; force times an unsampled request without emitting it."""
+        sampled = self.sample_rate > 0 and (self.sample_rate >= 1 or self.random_func() < self.sample_rate)
+        if sampled or force:
+            return PhaseTimer(sampled)
+        return NULL_TIMER
+
+
+    def emit(self, timer, properties=None):
+        if timer.sampled and len(timer.timings) > 0:
+            self.write(timer.to_dict(), properties if properties is not None else {}, dict(timer.counts))
+
+
+    def write(self, timings, properties, counts):
+        raise NotImplementedError()
+
+
+class EmfCollector(MetricCollector):
+
+    def __init__(self, namespace, dimensions, sample_rate=1.0, stream=None, random_func=random.random):
+        super().__init__(sample_rate, random_func)
+        self.namespace = namespace
+        self.dimensions = dimensions
+        self.stream = stream
+
+
+    def build_record(self, timings, properties, counts=None):
+        counts = counts if counts is not None else {}
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [
+                    {
+                        'Namespace': self.namespace,
+                        'Dimensions': [list(self.dimensions.keys())],
+                        'Metrics': [{'Name': name, 'Unit': 'Milliseconds'} for name in sorted(timings.keys())]
+                                   + [{'Name': name, 'Unit': 'Count'} for name in sorted(counts.keys())]
+                    }
+                ]
+            }
+        }
+        record.update(properties)
+        record.update(self.dimensions)
+        record.update(timings)
+        record.update(counts)
+        return record
+
+
+    def write(self, timings, properties, counts):
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.write(json.dumps(self.build_record(timings, properties, counts)) + '\n')
+        stream.flush()
+
+
+class InMemoryCollector(MetricCollector):
+    """Keeps the emitted timings, for tests."""
+
+    def __init__(self, sample_rate=1.0, random_func=random.random):
+        super().__init__(sample_rate, random_func)
+        self.records = []
+
+
+    def write(self, timings, properties, counts):
+        record = dict(properties)
+        record.update(timings)
+        record.update(counts)
+        self.records.append(record)
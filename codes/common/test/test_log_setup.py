@@ -0,0 +1,87 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+import io
+import sys
+import time
+import logging
+
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/python')
+import log_setup
+
+
+class SlowStream(io.StringIO):
+    """Stands in for a slow stdout."""
+
+    def write(self, text):
+        time.sleep(0.01)
+        return super().write(text)
+
+
+def test_sampling_and_truncation():
+    stream = io.StringIO()
+    log_setup.stop()
+    logger = log_setup.setup_logging(logging.getLogger('test_sampling'), sample_rate=0.0, max_length=10, stream=stream)
+
+    log_setup.begin_request()
+    logger.info('unsampled request info')
+    logger.error('unsampled request error is never truncated')
+    logger.warning('unsampled request warning is never truncated')
+
+    log_setup.begin_request(sampled=True)
+    logger.info('sampled request info')
+    logger.debug('debug only when verbose')
+
+    log_setup.set_verbose(True)
+    log_setup.begin_request(sampled=False)
+    logger.debug('verbose debug')
+    log_setup.set_verbose(False)
+
+    assert(log_setup.flush())
+    lines = stream.getvalue().splitlines()
+    assert(lines == [
+        'unsampled request error is never truncated',
+        'unsampled request warning is never truncated',
+        'sampled re...(truncated 10 chars)',
+        'verbose de...(truncated 3 chars)'
+    ])
+
+
+def test_non_blocking():
+    stream = SlowStream()
+    log_setup.stop()
+    logger = log_setup.setup_logging(logging.getLogger('test_non_blocking'), queue_size=5, stream=stream)
+    log_setup.begin_request(sampled=True)
+
+    before = time.perf_counter()
+    for index in range(20):
+        logger.info('line {}'.format(index))
+    elapsed = time.perf_counter() - before
+    logger.error('error line')
+
+    # 20 synchronous writes would take 200ms; the overflow is dropped instead, except for errors
+    assert(elapsed < 0.1)
+    assert(log_setup.get_dropped_count() > 0)
+    assert(log_setup.flush(timeout_in_sec=5.0))
+    assert(stream.getvalue().splitlines()[-1] == 'error line')
+
+
+if __name__ == '__main__':
+    test_sampling_and_truncation()
+    test_non_blocking()
@@ -16,65 +16,317 @@ OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
+import time
+_module_start_time = time.perf_counter()
+
 import sys
 import os
 import json
 import decimal
+import hashlib
 import uuid
 import logging
+import threading
+import collections
+import concurrent.futures
 
 import boto3
-from botocore.exceptions import ClientError
+from botocore.config import Config
+from botocore.exceptions import ClientError, BotoCoreError
+
+# shared with the inference container, deployed as a Lambda layer(codes/common)
+import phase_timer
+import log_setup
+
+import hedging
+import routing
 
+_import_ms = (time.perf_counter() - _module_start_time) * 1000
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-log_handler = logging.StreamHandler(sys.stdout)
-logger.addHandler(log_handler)
+# INFO logs of only LOG_SAMPLE_RATE of the requests, errors always; LOG_VERBOSE logs everything
+logger = log_setup.setup_logging(
+    sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', '0.01')),
+    max_length=int(os.environ.get('LOG_MAX_LENGTH', '2000')),
+    verbose=os.environ.get('LOG_VERBOSE', 'false').lower() == 'true')
 
 _profile = None
 _sm_client = None
+_executor = None
+_hedged_invoker = None
+_variant_router = None
 
 _endpoint_name = os.environ.get('SAGEMAKER_ENDPOINT', 'TextClassificationDemo-TextClassification-Endpoint')
 
+# batch requests are split into chunks which are sent concurrently over one pooled client
+_invoke_concurrency = int(os.environ.get('INVOKE_CONCURRENCY', '8'))
+_max_batch_size = int(os.environ.get('MAX_BATCH_SIZE', '64'))
+_max_payload_bytes = int(os.environ.get('MAX_PAYLOAD_BYTES', str(5 * 1024 * 1024)))
+
+_cache_enable = os.environ.get('CACHE_ENABLE', 'false').lower() == 'true'
+_cache_max_entries = int(os.environ.get('CACHE_MAX_ENTRIES', '1024'))
+_cache_ttl_in_sec = float(os.environ.get('CACHE_TTL_IN_SEC', '60'))
+
+# build the client during the Lambda init phase instead of in the first request,
+# and optionally open the connection with one warm-up invoke
+_warmup_on_init = os.environ.get('WARMUP_ON_INIT', 'true').lower() == 'true'
+_warmup_invoke = os.environ.get('WARMUP_INVOKE', 'false').lower() == 'true'
+
+# sampled phase timings are logged as CloudWatch EMF lines; RETURN_TIMINGS adds them to the response
+_timing_sample_rate = float(os.environ.get('TIMING_SAMPLE_RATE', '0.1'))
+_return_timings = os.environ.get('RETURN_TIMINGS', 'false').lower() == 'true'
+_timing_collector = phase_timer.EmfCollector(os.environ.get('TIMING_NAMESPACE', 'ModelServing'),
+                                             {'Component': 'PredictorLambda'}, _timing_sample_rate)
+
+# tail-latency mode: adaptive timeout and one hedged duplicate after the HEDGE_PERCENTILE latency
+_hedge_enable = os.environ.get('HEDGE_ENABLE', 'false').lower() == 'true'
+_hedge_percentile = float(os.environ.get('HEDGE_PERCENTILE', '95'))
+_hedge_budget_ratio = float(os.environ.get('HEDGE_BUDGET_RATIO', '0.1'))
+_hedge_min_samples = int(os.environ.get('HEDGE_MIN_SAMPLES', '20'))
+_hedge_window_size = int(os.environ.get('HEDGE_WINDOW_SIZE', '1000'))
+_timeout_multiplier = float(os.environ.get('TIMEOUT_MULTIPLIER', '3'))
+_min_timeout_in_ms = float(os.environ.get('MIN_TIMEOUT_IN_MS', '200'))
+_max_timeout_in_ms = float(os.environ.get('MAX_TIMEOUT_IN_MS', '10000'))
+
+# client-side TargetVariant routing by recent latency/error rate; VARIANTS as in ModelServing ModelList
+_routing_enable = os.environ.get('ROUTING_ENABLE', 'false').lower() == 'true'
+_variants = json.loads(os.environ.get('VARIANTS', '[]'))
+_routing_epsilon = float(os.environ.get('ROUTING_EPSILON', '0.05'))
+_routing_alpha = float(os.environ.get('ROUTING_EWMA_ALPHA', '0.2'))
+
+# hedging counters are written as deltas, unsampled but only when a hedge or timeout happened
+_hedge_count_names = {'calls': 'invoke_calls', 'hedges': 'hedge_sent', 'hedge_wins': 'hedge_won', 'timeouts': 'invoke_timeout'}
+_hedge_counts_emitted = {}
+
+_cold_start_timings = {'import_ms': _import_ms}
+_cold_start = True
+
+
+class LocalCacheBackend(object):
+    """In-memory response cache which lives in module scope across warm invocations.
+
+    A shared backend(e.g. ElastiCache) can replace this through set_cache_backend(),
+    if it provides the same get(key) and put(key, value, ttl_in_sec) methods for string values.
+    """
+
+    def __init__(self, max_entries, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+
+    def put(self, key, value, ttl_in_sec):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, self.clock() + ttl_in_sec)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_cache_backend = LocalCacheBackend(_cache_max_entries)
+
 
 def set_profile(target):
     global _profile
     _profile = target
 
 
-def get_client(service, profile):
+def get_client(service, profile, config=None):
     if profile is None:
-        return boto3.client(service)
+        return boto3.client(service, config=config)
     else:
-        return boto3.Session(profile_name=profile).client(service)
+        return boto3.Session(profile_name=profile).client(service, config=config)
+
+
+def set_timing_collector(collector):
+    global _timing_collector
+    _timing_collector = collector
+
+
+def set_cache_backend(backend):
+    global _cache_backend
+    _cache_backend = backend
 
 
 def load_sm_client():
     global _sm_client
     if _sm_client is None:
-        _sm_client = get_client('sagemaker-runtime', _profile)
+        if _hedge_enable:
+            # a hedge may double the connections in use; abandoned calls end at MAX_TIMEOUT_IN_MS
+            config = Config(max_pool_connections=_invoke_concurrency * 2,
+                            read_timeout=_max_timeout_in_ms / 1000)
+        else:
+            config = Config(max_pool_connections=_invoke_concurrency)
+        _sm_client = get_client('sagemaker-runtime', _profile, config)
     return _sm_client
 
 
+def load_executor():
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=_invoke_concurrency)
+    return _executor
+
+
+def load_hedged_invoker():
+    global _hedged_invoker
+    if _hedged_invoker is None:
+        # its own threads: batch chunks already run on the executor and wait for these calls
+        _hedged_invoker = hedging.HedgedInvoker(
+            concurrent.futures.ThreadPoolExecutor(max_workers=_invoke_concurrency * 2),
+            hedging.LatencyWindow(_hedge_window_size),
+            hedging.RetryBudget(_hedge_budget_ratio),
+            hedge_percentile=_hedge_percentile,
+            min_samples=_hedge_min_samples,
+            timeout_multiplier=_timeout_multiplier,
+            min_timeout_in_ms=_min_timeout_in_ms,
+            max_timeout_in_ms=_max_timeout_in_ms)
+    return _hedged_invoker
+
+
+def load_variant_router():
+    global _variant_router
+    if _variant_router is None:
+        _variant_router = routing.VariantRouter(_variants, alpha=_routing_alpha, epsilon=_routing_epsilon)
+    return _variant_router
+
+
+def get_routing_stats():
+    return _variant_router.stats() if _variant_router is not None else None
+
+
+def get_hedge_stats():
+    return _hedged_invoker.stats() if _hedged_invoker is not None else None
+
+
+def emit_hedge_counts(properties=None):
+    """Writes the hedging counters since the last written line as one EMF line, regardless of TIMING_SAMPLE_RATE.
+
+    Requests without a hedge or timeout write nothing; their invoke_calls go into the next line.
+    """
+    global _hedge_counts_emitted
+    stats = get_hedge_stats()
+    if stats is None:
+        return
+    counts = {name: stats[key] - _hedge_counts_emitted.get(key, 0) for key, name in _hedge_count_names.items()}
+    if all(value == 0 for name, value in counts.items() if name != 'invoke_calls'):
+        return
+    _hedge_counts_emitted = {key: stats[key] for key in _hedge_count_names.keys()}
+    _timing_collector.write({}, properties if properties is not None else {}, counts)
+
+
+def get_cold_start_timings():
+    return dict(_cold_start_timings)
+
+
+def warm_up():
+    before = time.perf_counter()
+    client = load_sm_client()
+    load_executor()
+    if _hedge_enable:
+        load_hedged_invoker()
+    if _routing_enable:
+        load_variant_router()
+    _cold_start_timings['client_ms'] = (time.perf_counter() - before) * 1000
+
+    if _warmup_invoke:
+        before = time.perf_counter()
+        try:
+            client.invoke_endpoint(
+                EndpointName=_endpoint_name,
+                ContentType='application/json',
+                Body=json.dumps({'sentence': 'warm up'}))['Body'].read()
+        except Exception as e:
+            logger.error('warm_up: warm-up invoke failed - {}'.format(e))
+        _cold_start_timings['warmup_invoke_ms'] = (time.perf_counter() - before) * 1000
+
+
 def decimal_default(obj):
     if isinstance(obj, decimal.Decimal):
         return str(obj)
     raise TypeError
 
 
-def predict(client, endpoint_name, request):
-    logger.info("sagemaker invoke: request-> {}".format(request))
+def get_cache_key(request):
+    canonical = json.dumps(request, sort_keys=True, separators=(',', ':'), default=decimal_default)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def load_cached_prediction(request):
+    if not _cache_enable:
+        return None
+
+    value = _cache_backend.get(get_cache_key(request))
+    if value is None:
+        return None
+    return json.loads(value)
+
+
+def save_cached_prediction(request, prediction):
+    if _cache_enable and prediction.get('success') == 'true':
+        _cache_backend.put(get_cache_key(request), json.dumps(prediction), _cache_ttl_in_sec)
+
+
+def invoke_endpoint(client, endpoint_name, request):
+    kwargs = {}
+    if _routing_enable and len(_variants) > 0:
+        router = load_variant_router()
+        kwargs['TargetVariant'] = router.choose()
 
+    before = time.perf_counter()
     try:
         response = client.invoke_endpoint(
             EndpointName=endpoint_name,
             ContentType='application/json',
-            Body=json.dumps(request, default=decimal_default))
-
+            Body=json.dumps(request, default=decimal_default),
+            **kwargs)
         response = json.loads(response['Body'].read().decode('utf-8'))
+    except Exception:
+        if 'TargetVariant' in kwargs:
+            router.record(kwargs['TargetVariant'], (time.perf_counter() - before) * 1000, True)
+        raise
+
+    if 'TargetVariant' in kwargs:
+        router.record(kwargs['TargetVariant'], (time.perf_counter() - before) * 1000, False)
+    return response
+
+
+def predict(client, endpoint_name, request, timer=phase_timer.NULL_TIMER):
+    logger.debug('sagemaker invoke: request-> %s', request)
+
+    try:
+        with timer.span('predict'):
+            if _hedge_enable:
+                response = load_hedged_invoker().invoke(lambda: invoke_endpoint(client, endpoint_name, request))
+            else:
+                response = invoke_endpoint(client, endpoint_name, request)
+
+        # phases measured in the container(ENV_RETURN_TIMINGS), never cached or returned as a prediction
+        container_timings = response.pop('timings', None)
+        if container_timings is not None:
+            for name, value in container_timings.items():
+                timer.add('container_' + name, value)
+            # network, TLS and model server time outside of input_fn/predict_fn
+            timer.add('invoke_overhead', timer.get('predict', 0.0)
+                      - container_timings.get('input_fn', 0.0) - container_timings.get('predict_fn', 0.0))
         return response
-    except ClientError as e:
+    except (ClientError, BotoCoreError, hedging.InvokeTimeout) as e:
+        # BotoCoreError: read timeout(MAX_TIMEOUT_IN_MS with hedging) or connection errors
         logger.error('Error: sagemaker invoke ====> {}'.format(e))
         return None
 
@@ -91,18 +343,128 @@ def create_error_response(id, error):
     }
 
 
+def split_chunks(sentences, indexes):
+    # {"sentences": [...]} around the items
+    envelope_bytes = len(json.dumps({'sentences': []}).encode('utf-8'))
+    chunks = []
+    oversized = []
+    chunk = []
+    chunk_bytes = envelope_bytes
+    for index in indexes:
+        # ', ' separator + the JSON-encoded sentence
+        item_bytes = len(json.dumps(sentences[index]).encode('utf-8')) + 2
+        if envelope_bytes + item_bytes > _max_payload_bytes:
+            oversized.append(index)
+            continue
+
+        if len(chunk) >= _max_batch_size or chunk_bytes + item_bytes > _max_payload_bytes:
+            chunks.append(chunk)
+            chunk = []
+            chunk_bytes = envelope_bytes
+        chunk.append(index)
+        chunk_bytes += item_bytes
+
+    if len(chunk) > 0:
+        chunks.append(chunk)
+    return chunks, oversized
+
+
+def create_item_id(message_id, index):
+    return '{}-{}'.format(message_id, index)
+
+
+def handle_batch(message_id, sentences, timer=phase_timer.NULL_TIMER):
+    results = [None] * len(sentences)
+    pending = []
+    for index, sentence in enumerate(sentences):
+        prediction = load_cached_prediction({'sentence': sentence})
+        if prediction is not None:
+            results[index] = create_success_response(create_item_id(message_id, index), prediction)
+        else:
+            pending.append(index)
+
+    chunks, oversized = split_chunks(sentences, pending)
+    for index in oversized:
+        results[index] = create_error_response(create_item_id(message_id, index), 'sentence exceeds payload limit')
+
+    sm_client = load_sm_client()
+    executor = load_executor()
+    futures = [(chunk, executor.submit(predict, sm_client, _endpoint_name, {'sentences': [sentences[index] for index in chunk]}))
+                for chunk in chunks]
+
+    for chunk, future in futures:
+        try:
+            with timer.span('predict'):
+                prediction = future.result()
+        except Exception as e:
+            logger.error('Error: sagemaker batch invoke ====> {}'.format(e))
+            prediction = None
+
+        if prediction is None or prediction.get('success') != 'true' or len(prediction.get('labels', [])) != len(chunk):
+            for index in chunk:
+                results[index] = create_error_response(create_item_id(message_id, index), 'no response from sagemaker')
+            continue
+
+        for index, label in zip(chunk, prediction['labels']):
+            item = {'success': 'true', 'label': label}
+            save_cached_prediction({'sentence': sentences[index]}, item)
+            results[index] = create_success_response(create_item_id(message_id, index), item)
+
+    return create_success_response(message_id, {'success': 'true', 'results': results})
+
+
 def handle(event, context):
-    logger.info('handler handle: event-> {}'.format(event))
+    global _cold_start
+    before = time.perf_counter()
+    log_setup.begin_request()
+    timer = _timing_collector.start(force=_return_timings)
+    response = None
+    try:
+        with timer.span('handler'):
+            response = handle_request(event, timer)
+        if _return_timings and 'Error' not in response:
+            response['Timings'] = timer.to_dict()
+        return response
+    finally:
+        properties = {'MessageId': response['MessageId']} if response is not None else None
+        _timing_collector.emit(timer, properties)
+        if _hedge_enable:
+            emit_hedge_counts(properties)
+        if _cold_start:
+            _cold_start = False
+            _cold_start_timings['first_invoke_ms'] = (time.perf_counter() - before) * 1000
+            logger.info(json.dumps({'ColdStart': _cold_start_timings}), extra=log_setup.ALWAYS)
+        # the sandbox may be frozen after return, so write the queued logs of this request now
+        log_setup.flush()
+
+
+def handle_request(event, timer=phase_timer.NULL_TIMER):
+    logger.debug('handler handle: event-> %s', event)
 
     message_id = str(uuid.uuid4())
 
     if 'sentence' in event:
+        prediction = load_cached_prediction(event)
+        if prediction is not None:
+            return create_success_response(message_id, prediction)
+
         sm_client = load_sm_client()
-        prediction = predict(sm_client, _endpoint_name, event)
+        prediction = predict(sm_client, _endpoint_name, event, timer)
 
         if prediction is not None:
+            save_cached_prediction(event, prediction)
             return create_success_response(message_id, prediction)
         else:
             return create_error_response(message_id, 'no response from sagemaker')
+    elif 'sentences' in event:
+        sentences = event['sentences']
+        if not isinstance(sentences, list) or not all(isinstance(sentence, str) for sentence in sentences):
+            return create_error_response(message_id, 'wrong request format')
+        return handle_batch(message_id, sentences, timer)
     else:
         return create_error_response(message_id, 'wrong request format')
+
+
+# AWS Lambda runs module scope in the init phase, which is not billed to the first request
+if _warmup_on_init and 'AWS_LAMBDA_FUNCTION_NAME' in os.environ:
+    warm_up()
@@ -0,0 +1,193 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Hedged requests with adaptive timeouts, for the tail latency of endpoint invocation.
+
+A rolling window of recent invocation latencies lives in module scope, so it survives warm
+invocations of the Lambda function. When a call has not completed after the HEDGE_PERCENTILE
+latency, one duplicate is sent and the first success wins. A retry budget caps the duplicates
+at a ratio of all calls, so a slow endpoint does not receive twice the load.
+"""
+
+import time
+import threading
+import collections
+import concurrent.futures
+
+
+class InvokeTimeout(Exception):
+    pass
+
+
+class LatencyWindow(object):
+    """The last max_size latencies(ms), with percentiles over them."""
+
+    def __init__(self, max_size=1000):
+        self._values = collections.deque(maxlen=max_size)
+        self._lock = threading.Lock()
+
+
+    def record(self, latency_in_ms):
+        with self._lock:
+            self._values.append(latency_in_ms)
+
+
+    def __len__(self):
+        return len(self._values)
+
+
+    def percentile(self, percent):
+        with self._lock:
+            values = sorted(self._values)
+        if len(values) == 0:
+            return None
+        return values[min(len(values) - 1, int(len(values) * percent / 100.0))]
+
+
+class RetryBudget(object):
+    """Token bucket: every call deposits ratio tokens, every hedge withdraws one."""
+
+    def __init__(self, ratio=0.1, max_tokens=10.0, initial_tokens=1.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = initial_tokens
+        self._lock = threading.Lock()
+
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+
+class HedgedInvoker(object):
+
+    def __init__(self, executor, window, budget, hedge_percentile=95.0, min_samples=20,
+                 timeout_multiplier=3.0, min_timeout_in_ms=200.0, max_timeout_in_ms=10000.0,
+                 clock=time.perf_counter):
+        self.executor = executor
+        self.window = window
+        self.budget = budget
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout_in_ms = min_timeout_in_ms
+        self.max_timeout_in_ms = max_timeout_in_ms
+        self.clock = clock
+
+        # updated from the batch executor threads
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+    def get_hedge_delay(self):
+        # no hedging until the window knows what slow means
+        if len(self.window) < self.min_samples:
+            return None
+        return self.window.percentile(self.hedge_percentile)
+
+
+    def get_timeout(self):
+        if len(self.window) < self.min_samples:
+            return self.max_timeout_in_ms
+        timeout = self.window.percentile(99) * self.timeout_multiplier
+        return min(self.max_timeout_in_ms, max(self.min_timeout_in_ms, timeout))
+
+
+    def _submit(self, call):
+        start_time = self.clock()
+        future = self.executor.submit(call)
+
+        def record(future):
+            # every successful call, also a losing one, so the window is not biased to winners
+            if future.exception() is None:
+                self.window.record((self.clock() - start_time) * 1000)
+
+        future.add_done_callback(record)
+        return future
+
+
+    def invoke(self, call):
+        """Returns the result of call(); raises its exception, or InvokeTimeout."""
+        self._count('calls')
+        self.budget.deposit()
+        start_time = self.clock()
+        deadline = start_time + self.get_timeout() / 1000
+        hedge_delay = self.get_hedge_delay()
+
+        primary = self._submit(call)
+        pending = {primary}
+        hedge = None
+        error = None
+        while len(pending) > 0:
+            if hedge is None and hedge_delay is not None:
+                wait_until = min(deadline, start_time + hedge_delay / 1000)
+            else:
+                wait_until = deadline
+            done, pending = concurrent.futures.wait(pending, timeout=max(0.0, wait_until - self.clock()),
+                                                    return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+
+            if self.clock() >= deadline:
+                break
+            if hedge is None and hedge_delay is not None and len(pending) > 0:
+                if not self.budget.withdraw():
+                    hedge_delay = None
+                    continue
+                self._count('hedges')
+                hedge = self._submit(call)
+                pending.add(hedge)
+
+        if len(pending) == 0 and error is not None:
+            raise error
+        self._count('timeouts')
+        raise InvokeTimeout('no response in {:.0f} ms'.format((deadline - start_time) * 1000))
+
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'calls': self.calls,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'timeouts': self.timeouts
+            }
+        stats['hedge_delay_ms'] = self.get_hedge_delay()
+        stats['timeout_ms'] = self.get_timeout()
+        return stats
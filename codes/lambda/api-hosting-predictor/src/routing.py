@@ -0,0 +1,108 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Client-side TargetVariant routing by recent latency and error rate of each variant.
+
+Each variant keeps an exponentially weighted moving average(EWMA) of its latency and error
+rate in module scope, across warm invocations. A variant is picked with probability
+proportional to VariantWeight / score, so equal variants keep the static traffic split and a
+slow or failing one loses traffic within seconds. With probability epsilon the pick is
+uniform, so a variant which lost its traffic is still measured and can recover.
+"""
+
+import random
+import threading
+
+
+class VariantStats(object):
+
+    def __init__(self, name, weight):
+        self.name = name
+        self.weight = weight
+        self.count = 0
+        self.latency_ms = None
+        self.error_rate = 0.0
+
+
+    def to_dict(self):
+        return {
+            'weight': self.weight,
+            'count': self.count,
+            'latency_ms': self.latency_ms,
+            'error_rate': self.error_rate
+        }
+
+
+class VariantRouter(object):
+
+    def __init__(self, variants, alpha=0.2, epsilon=0.05, error_penalty_ms=1000.0, random_func=random.random):
+        """variants: list of {'VariantName', 'VariantWeight'}, as in ModelServing ModelList."""
+        self.variants = [VariantStats(variant['VariantName'], float(variant.get('VariantWeight', 1)))
+                         for variant in variants]
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.error_penalty_ms = error_penalty_ms
+        self.random_func = random_func
+        self._lock = threading.Lock()
+
+
+    def score(self, stats):
+        # lower is better; an error costs like error_penalty_ms of extra latency
+        return max(stats.latency_ms, 1.0) + stats.error_rate * self.error_penalty_ms
+
+
+    def choose(self):
+        with self._lock:
+            # measure every variant once before comparing
+            for stats in self.variants:
+                if stats.count == 0:
+                    return stats.name
+
+            if self.random_func() < self.epsilon:
+                return self.variants[int(self.random_func() * len(self.variants)) % len(self.variants)].name
+
+            shares = [stats.weight / self.score(stats) for stats in self.variants]
+            pick = self.random_func() * sum(shares)
+            for stats, share in zip(self.variants, shares):
+                pick -= share
+                if pick < 0:
+                    return stats.name
+            return self.variants[-1].name
+
+
+    def record(self, name, latency_ms, error):
+        with self._lock:
+            for stats in self.variants:
+                if stats.name == name:
+                    break
+            else:
+                return
+
+            if stats.count == 0:
+                stats.latency_ms = latency_ms
+                stats.error_rate = 1.0 if error else 0.0
+            else:
+                stats.latency_ms += self.alpha * (latency_ms - stats.latency_ms)
+                stats.error_rate += self.alpha * ((1.0 if error else 0.0) - stats.error_rate)
+            stats.count += 1
+
+
+    def stats(self):
+        with self._lock:
+            return {stats.name: stats.to_dict() for stats in self.variants}
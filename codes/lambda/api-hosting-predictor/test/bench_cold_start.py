@@ -0,0 +1,119 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Measures cold and warm latency of the predictor handler locally, with sagemaker-runtime
+stubbed by botocore Stubber. Every run is a fresh interpreter, like a new Lambda sandbox:
+  init       - module import, plus the client warm-up when WARMUP_ON_INIT=true
+  first      - the first handle() call
+  warm       - p50/p99 of the following handle() calls
+
+  python3 bench_cold_start.py --runs 10
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+_src_dir = os.path.dirname(os.path.abspath(os.path.dirname(__file__))) + '/src'
+
+_child_script = '''
+import io, sys, json, time
+before = time.perf_counter()
+import boto3
+from botocore.stub import Stubber
+from botocore.response import StreamingBody
+
+# attach the stubber wherever the handler creates its client(init phase or first request)
+body = json.dumps({{'success': 'true', 'label': 3}}).encode('utf-8')
+create_client = boto3.client
+def stubbed_client(*args, **kwargs):
+    client = create_client(*args, **kwargs)
+    stubber = Stubber(client)
+    for _ in range({invokes}):
+        stubber.add_response('invoke_endpoint', {{'Body': StreamingBody(io.BytesIO(body), len(body))}})
+    stubber.activate()
+    client.stubber = stubber
+    return client
+boto3.client = stubbed_client
+
+sys.path.append({src_dir!r})
+sys.path.append({src_dir!r} + '/../../../common/python')
+import handler
+init_ms = (time.perf_counter() - before) * 1000
+
+latencies = []
+for index in range({invokes}):
+    before = time.perf_counter()
+    handler.handle({{'sentence': 'Stock investing has higher returns in the long run.'}}, None)
+    latencies.append((time.perf_counter() - before) * 1000)
+
+print(json.dumps({{'init_ms': init_ms, 'latencies_ms': latencies, 'timings': handler.get_cold_start_timings()}}))
+'''
+
+
+def run_once(warmup_on_init, invokes):
+    env = dict(os.environ,
+               AWS_LAMBDA_FUNCTION_NAME='bench-cold-start',
+               AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'),
+               AWS_ACCESS_KEY_ID='bench', AWS_SECRET_ACCESS_KEY='bench',
+               WARMUP_ON_INIT='true' if warmup_on_init else 'false',
+               WARMUP_INVOKE='false',
+               TIMING_SAMPLE_RATE='0')
+    output = subprocess.check_output([sys.executable, '-c', _child_script.format(src_dir=_src_dir, invokes=invokes)], env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def percentile(values, ratio):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def run_benchmark(runs, invokes):
+    results = {}
+    for warmup_on_init in [False, True]:
+        samples = [run_once(warmup_on_init, invokes) for _ in range(runs)]
+        warm = [latency for sample in samples for latency in sample['latencies_ms'][1:]]
+        first = [sample['latencies_ms'][0] for sample in samples]
+        init = [sample['init_ms'] for sample in samples]
+        results['init' if warmup_on_init else 'lazy'] = {
+            'init_ms_p50': percentile(init, 0.5),
+            'first_ms_p50': percentile(first, 0.5),
+            'first_ms_max': max(first),
+            'cold_total_ms_p50': percentile([i + f for i, f in zip(init, first)], 0.5),
+            'warm_ms_p50': percentile(warm, 0.5),
+            'warm_ms_p99': percentile(warm, 0.99),
+            'client_ms_p50': percentile([sample['timings'].get('client_ms', 0.0) for sample in samples], 0.5)
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10, help='cold starts per mode')
+    parser.add_argument('--invokes', type=int, default=50, help='handle() calls per cold start')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.runs, args.invokes)
+    print('{:<6} {:>10} {:>10} {:>10} {:>10} {:>10}'.format('mode', 'init', 'first', 'cold', 'warm p50', 'warm p99'))
+    for mode, result in results.items():
+        print('{:<6} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.3f} {:>10.3f}'.format(
+            mode, result['init_ms_p50'], result['first_ms_p50'], result['cold_total_ms_p50'],
+            result['warm_ms_p50'], result['warm_ms_p99']))
@@ -22,6 +22,7 @@ import json
 import logging
 
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/src')
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/../../common/python')
 import handler
 handler.set_profile('cdk-demo')
 
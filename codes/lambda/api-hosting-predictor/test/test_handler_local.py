@@ -0,0 +1,311 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import threading
+import concurrent.futures
+
+os.environ['CACHE_ENABLE'] = 'true'
+os.environ['CACHE_TTL_IN_SEC'] = '60'
+
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/src')
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/../../common/python')
+import handler
+import hedging
+import routing
+import phase_timer
+
+
+class StubSageMakerClient(object):
+    """Stands in for the sagemaker-runtime client: labels a sentence with its word count."""
+
+    def __init__(self, fail_word=None, timings=None):
+        self.fail_word = fail_word
+        self.timings = timings
+        self.requests = []
+
+
+    def invoke_endpoint(self, **kwargs):
+        request = json.loads(kwargs['Body'])
+        self.requests.append(request)
+
+        if 'sentences' in request:
+            if any(self.fail_word in sentence for sentence in request['sentences']):
+                raise handler.ClientError({'Error': {'Code': 'ModelError', 'Message': 'failed'}}, 'InvokeEndpoint')
+            body = {'success': 'true', 'labels': [len(sentence.split()) for sentence in request['sentences']]}
+        else:
+            body = {'success': 'true', 'label': len(request['sentence'].split())}
+        if self.timings is not None:
+            body['timings'] = self.timings
+        return {'Body': io.BytesIO(json.dumps(body).encode('utf-8'))}
+
+
+class SlowStubSageMakerClient(StubSageMakerClient):
+    """Answers the n-th call after delays[n] seconds(the last delay repeats)."""
+
+    def __init__(self, delays):
+        super().__init__()
+        self.delays = delays
+        self._lock = threading.Lock()
+
+
+    def invoke_endpoint(self, **kwargs):
+        with self._lock:
+            delay = self.delays[min(len(self.requests), len(self.delays) - 1)]
+            response = super().invoke_endpoint(**kwargs)
+        time.sleep(delay)
+        return response
+
+
+class VariantStubSageMakerClient(StubSageMakerClient):
+    """Answers by TargetVariant: after delays[variant] seconds, or fails for fail_variant."""
+
+    def __init__(self, delays, fail_variant=None):
+        super().__init__()
+        self.delays = delays
+        self.fail_variant = fail_variant
+        self.variants = []
+
+
+    def invoke_endpoint(self, **kwargs):
+        variant = kwargs['TargetVariant']
+        self.variants.append(variant)
+        time.sleep(self.delays[variant])
+        if variant == self.fail_variant:
+            raise handler.ClientError({'Error': {'Code': 'ModelError', 'Message': 'failed'}}, 'InvokeEndpoint')
+        return super().invoke_endpoint(**kwargs)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _setup(client, clock=None):
+    handler._sm_client = client
+    handler.set_cache_backend(handler.LocalCacheBackend(16, clock=clock if clock is not None else FakeClock()))
+
+
+def test_response_cache_hit():
+    client = StubSageMakerClient()
+    _setup(client)
+
+    first = handler.handle({'sentence': 'Baseball is popular.'}, None)
+    second = handler.handle({'sentence': 'Baseball is popular.'}, None)
+
+    assert(len(client.requests) == 1)
+    assert(first['label'] == second['label'] == 3)
+    assert(first['MessageId'] != second['MessageId'])
+
+
+def test_response_cache_ttl():
+    client = StubSageMakerClient()
+    clock = FakeClock()
+    _setup(client, clock)
+
+    handler.handle({'sentence': 'Baseball is popular.'}, None)
+    clock.now += 61
+    handler.handle({'sentence': 'Baseball is popular.'}, None)
+
+    assert(len(client.requests) == 2)
+
+
+def test_batch_prediction():
+    client = StubSageMakerClient(fail_word='error')
+    _setup(client)
+    max_batch_size = handler._max_batch_size
+    handler._max_batch_size = 2
+
+    sentences = ['one', 'one two', 'one two three', 'error here', 'one two three four']
+    response = handler.handle({'sentences': sentences}, None)
+    handler._max_batch_size = max_batch_size
+
+    # chunks: [0, 1], [2, 3], [4]; the second chunk fails as a whole
+    assert(len(client.requests) == 3)
+    results = response['results']
+    assert([result.get('label') for result in results] == [1, 2, None, None, 4])
+    assert(results[2]['Error'] == 'no response from sagemaker')
+    assert(results[3]['MessageId'] == '{}-3'.format(response['MessageId']))
+
+    # cached items are not sent again
+    response = handler.handle({'sentences': ['one two', 'five']}, None)
+    assert(client.requests[-1] == {'sentences': ['five']})
+    assert([result['label'] for result in response['results']] == [2, 1])
+
+
+def test_phase_timings():
+    client = StubSageMakerClient(timings={'input_fn': 0.5, 'preprocess': 0.25, 'forward': 1.0, 'predict_fn': 1.5})
+    _setup(client)
+    collector = phase_timer.InMemoryCollector(sample_rate=1.0)
+    handler.set_timing_collector(collector)
+    handler._return_timings = True
+    try:
+        first = handler.handle({'sentence': 'Timings are returned.'}, None)
+        second = handler.handle({'sentence': 'Timings are returned.'}, None)
+    finally:
+        handler._return_timings = False
+        handler.set_timing_collector(phase_timer.InMemoryCollector(sample_rate=0.0))
+
+    # container timings are merged into the Lambda timings, never into the prediction
+    assert('timings' not in first and 'timings' not in second)
+    assert(first['Timings']['container_forward'] == 1.0)
+    assert(abs(first['Timings']['invoke_overhead'] - (first['Timings']['predict'] - 2.0)) < 0.002)
+    assert(first['Timings']['handler'] >= first['Timings']['predict'])
+    # the second one is a cache hit
+    assert('predict' not in second['Timings'])
+    assert([record['MessageId'] for record in collector.records] == [first['MessageId'], second['MessageId']])
+
+
+def test_split_chunks_within_payload_limit():
+    sentences = ['word ' * 20, 'word ' * 30, 'word ' * 10, 'word ' * 40]
+    max_payload_bytes = handler._max_payload_bytes
+    handler._max_payload_bytes = 210
+    try:
+        chunks, oversized = handler.split_chunks(sentences, list(range(len(sentences))))
+    finally:
+        handler._max_payload_bytes = max_payload_bytes
+
+    # the request body, including {"sentences": [...]}, fits for every chunk
+    assert(oversized == [3])
+    assert(sum(len(chunk) for chunk in chunks) == len(sentences) - 1)
+    for chunk in chunks:
+        assert(len(json.dumps({'sentences': [sentences[index] for index in chunk]}).encode('utf-8')) <= 210)
+
+
+def _setup_hedging(budget_ratio=1.0):
+    handler._hedge_enable = True
+    handler._hedge_counts_emitted = {}
+    handler._hedged_invoker = hedging.HedgedInvoker(
+        concurrent.futures.ThreadPoolExecutor(max_workers=4),
+        hedging.LatencyWindow(100),
+        hedging.RetryBudget(budget_ratio, initial_tokens=0.0),
+        hedge_percentile=90, min_samples=10, timeout_multiplier=3.0,
+        min_timeout_in_ms=150.0, max_timeout_in_ms=1000.0)
+    return handler._hedged_invoker
+
+
+def test_hedged_request():
+    # 10 fast calls fill the window, then the 11th call is slow and its hedge(12th) is fast
+    client = SlowStubSageMakerClient([0.01] * 10 + [0.5, 0.01])
+    invoker = _setup_hedging()
+    collector = phase_timer.InMemoryCollector(sample_rate=0.0)
+    handler.set_timing_collector(collector)
+    try:
+        for index in range(10):
+            assert(handler.predict(client, 'endpoint', {'sentence': 'fast {}'.format(index)})['label'] == 2)
+        handler.emit_hedge_counts()
+        before = time.perf_counter()
+        prediction = handler.predict(client, 'endpoint', {'sentence': 'slow primary'})
+        elapsed = time.perf_counter() - before
+        handler.emit_hedge_counts()
+    finally:
+        handler._hedge_enable = False
+
+    assert(prediction['label'] == 2)
+    assert(elapsed < 0.2)
+    assert(len(client.requests) == 12)
+    assert(invoker.stats()['hedges'] == 1 and invoker.stats()['hedge_wins'] == 1)
+    # counted for unsampled requests too, but written only when something happened
+    assert(collector.records == [
+        {'invoke_calls': 11, 'hedge_sent': 1, 'hedge_won': 1, 'invoke_timeout': 0}])
+
+
+def test_hedge_budget_and_timeout():
+    # every call after the warm-up hangs; 11 deposits of 0.1 allow only 1 hedge
+    client = SlowStubSageMakerClient([0.01] * 10 + [2.0])
+    invoker = _setup_hedging(budget_ratio=0.1)
+    try:
+        for index in range(10):
+            handler.predict(client, 'endpoint', {'sentence': 'fast {}'.format(index)})
+        before = time.perf_counter()
+        first = handler.predict(client, 'endpoint', {'sentence': 'slow one'})
+        second = handler.predict(client, 'endpoint', {'sentence': 'slow two'})
+        elapsed = time.perf_counter() - before
+    finally:
+        handler._hedge_enable = False
+
+    # adaptive timeout: max(150ms, 3 x p99 of ~10ms) instead of botocore's 60 sec
+    assert(first is None and second is None)
+    assert(elapsed < 0.5)
+    assert(invoker.stats()['hedges'] == 1)
+    assert(invoker.stats()['timeouts'] == 2)
+    assert(len(client.requests) == 13)
+
+
+class BrokenConnectionStubSageMakerClient(object):
+
+    def invoke_endpoint(self, **kwargs):
+        raise handler.BotoCoreError()
+
+
+def test_connection_error():
+    # read timeouts and connection errors return the error response instead of raising
+    assert(handler.predict(BrokenConnectionStubSageMakerClient(), 'endpoint', {'sentence': 'no connection'}) is None)
+
+
+def _route(client, count):
+    handler._routing_enable = True
+    handler._variants = [{'VariantName': 'Model-A', 'VariantWeight': 1}, {'VariantName': 'Model-B', 'VariantWeight': 1}]
+    handler._variant_router = routing.VariantRouter(handler._variants, epsilon=0.05, random_func=random.Random(7).random)
+    try:
+        predictions = [handler.predict(client, 'endpoint', {'sentence': 'routed {}'.format(index)}) for index in range(count)]
+    finally:
+        handler._routing_enable = False
+    return predictions
+
+
+def test_routing_by_latency():
+    client = VariantStubSageMakerClient({'Model-A': 0.02, 'Model-B': 0.002})
+    _route(client, 150)
+
+    # with equal weights, the 10x faster variant gets most of the traffic, the slow one is still sampled
+    share = client.variants.count('Model-B') / len(client.variants)
+    assert(0.75 < share < 1.0)
+    stats = handler.get_routing_stats()
+    assert(stats['Model-A']['count'] > 0)
+    assert(stats['Model-A']['latency_ms'] > stats['Model-B']['latency_ms'])
+
+
+def test_routing_by_errors():
+    client = VariantStubSageMakerClient({'Model-A': 0.001, 'Model-B': 0.001}, fail_variant='Model-A')
+    predictions = _route(client, 100)
+
+    assert(client.variants.count('Model-B') > 80)
+    assert(sum(1 for prediction in predictions if prediction is None) == client.variants.count('Model-A'))
+    assert(handler.get_routing_stats()['Model-A']['error_rate'] > 0.5)
+
+
+if __name__ == '__main__':
+    test_response_cache_hit()
+    test_response_cache_ttl()
+    test_batch_prediction()
+    test_phase_timings()
+    test_split_chunks_within_payload_limit()
+    test_hedged_request()
+    test_hedge_budget_and_timeout()
+    test_connection_error()
+    test_routing_by_latency()
+    test_routing_by_errors()
@@ -0,0 +1,141 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Finds the highest request rate the endpoint sustains within a latency/error SLO.
+
+The rate is ramped up in stages(start_rate x ramp_factor ...) until a stage violates the SLO,
+and then binary-searched between the last passing and the first failing rate. Every stage is
+an open-loop run of HttpRequestTester, so queueing delay shows up in p99 instead of lowering
+the rate. The result is turned into an InvocationsPerInstance target for each variant.
+"""
+
+import json
+import logging
+
+import log_setup
+import latency_histogram
+
+logger = logging.getLogger()
+
+
+def summarize_stage(report, rate):
+    histogram = latency_histogram.LatencyHistogram()
+    for histogram_dict in report['histograms'].values():
+        histogram.merge(latency_histogram.LatencyHistogram.from_dict(histogram_dict))
+    errors = sum(report['errors'].values())
+    duration = report['duration_in_sec']
+
+    return {
+        'rate': rate,
+        'count': histogram.count,
+        'throughput': histogram.count / duration if duration > 0 else 0.0,
+        'p50': histogram.percentile(50),
+        'p99': histogram.percentile(99),
+        'error_rate': errors / histogram.count if histogram.count > 0 else 1.0
+    }
+
+
+def check_slo(stage, slo_p99_in_ms, slo_error_rate):
+    return stage['p99'] <= slo_p99_in_ms and stage['error_rate'] <= slo_error_rate
+
+
+def run_stage(request_tester, test_list, rate, duration):
+    report = request_tester.start_schedule(request_tester.build_rate_schedule(test_list, rate, duration))
+    return summarize_stage(report, rate)
+
+
+def search_capacity(request_tester, test_list, start_rate, max_rate, slo_p99_in_ms, slo_error_rate=0.001,
+                    stage_duration=30.0, ramp_factor=2.0, tolerance=0.05, max_stages=20):
+    stages = []
+
+    def measure(rate):
+        stage = run_stage(request_tester, test_list, rate, stage_duration)
+        stage['passed'] = check_slo(stage, slo_p99_in_ms, slo_error_rate)
+        stages.append(stage)
+        logger.info('search_capacity: stage {}'.format(json.dumps(stage)), extra=log_setup.ALWAYS)
+        return stage['passed']
+
+    # ramp up
+    low, high = 0.0, None
+    rate = start_rate
+    while len(stages) < max_stages:
+        if not measure(rate):
+            high = rate
+            break
+        low = rate
+        if rate >= max_rate:
+            break
+        rate = min(rate * ramp_factor, max_rate)
+
+    # already over the SLO at start_rate: searching down toward 0 would only burn stages
+    below_start_rate = len(stages) > 0 and not stages[0]['passed']
+    if below_start_rate:
+        logger.warning('search_capacity: start_rate {} already violates the SLO, lower StartRate'.format(start_rate))
+
+    # binary search between the last passing and the first failing rate
+    while not below_start_rate and high is not None and len(stages) < max_stages and (high - low) > tolerance * high:
+        rate = (low + high) / 2
+        if measure(rate):
+            low = rate
+        else:
+            high = rate
+
+    return {
+        'max_rate': low,
+        'limited_by_max_rate': high is None,
+        'below_start_rate': below_start_rate,
+        'slo': {'p99_in_ms': slo_p99_in_ms, 'error_rate': slo_error_rate},
+        'stages': stages
+    }
+
+
+def recommend_targets(max_rate, variants, safety_factor=0.7):
+    """InvocationsPerInstance(per minute, the metric of SageMaker auto-scaling) for each variant.
+
+    The endpoint splits the traffic by VariantWeight, so each instance of a variant served
+    max_rate * weight share / InstanceCount requests per second at the highest passing rate.
+    The search only sees the endpoint as a whole, so this is a lower bound for any variant
+    which was not the first to saturate.
+    """
+    total_weight = sum(float(variant['VariantWeight']) for variant in variants)
+    targets = {}
+    for variant in variants:
+        instance_count = int(variant['InstanceCount'])
+        if instance_count <= 0:
+            targets[variant['VariantName']] = {'sustained_rate_per_instance': None, 'InvocationsPerInstance': None}
+            continue
+        share = float(variant['VariantWeight']) / total_weight if total_weight > 0 else 0.0
+        per_instance_rate = max_rate * share / instance_count
+        targets[variant['VariantName']] = {
+            'sustained_rate_per_instance': per_instance_rate,
+            'InvocationsPerInstance': int(per_instance_rate * 60 * safety_factor)
+        }
+    return targets
+
+
+def run_capacity_search(request_tester, test_list, variants, start_rate, max_rate, slo_p99_in_ms,
+                        slo_error_rate=0.001, stage_duration=30.0, safety_factor=0.7):
+    result = search_capacity(request_tester, test_list, start_rate, max_rate, slo_p99_in_ms,
+                             slo_error_rate, stage_duration)
+    result['safety_factor'] = safety_factor
+    # no passing stage, so no measured rate to derive a target from
+    result['variants'] = recommend_targets(result['max_rate'], variants, safety_factor) \
+        if not result['below_start_rate'] else {}
+    logger.info(json.dumps({'CapacityReport': result}), extra=log_setup.ALWAYS)
+    return result
@@ -22,15 +22,35 @@ import time
 import json
 import logging
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-log_handler = logging.StreamHandler(sys.stdout)
-logger.addHandler(log_handler)
+# shared module, deployed as a Lambda layer(codes/common)
+import log_setup
+
+# INFO logs of only LOG_SAMPLE_RATE of the requests, errors and reports always
+logger = log_setup.setup_logging(
+    sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', '0.01')),
+    max_length=int(os.environ.get('LOG_MAX_LENGTH', '2000')),
+    verbose=os.environ.get('LOG_VERBOSE', 'false').lower() == 'true')
 
 import http_request_tester as tester
+import traffic_replay
+import capacity_search
+import variant_comparison
+
+# every tester client receives the SNS message; these modes set the total load themselves(or replay
+# the captured load as is), so they run only on the first client instead of TestClientCount times
+_single_client_modes = ['CapacitySearch', 'VariantComparison', 'Replay']
 
 
 def handle(event, context):
+    try:
+        handle_records(event)
+    finally:
+        log_setup.flush()
+
+
+def handle_records(event):
+    # the test setup logs below are not per-request, so keep them
+    log_setup.begin_request(sampled=True)
     logger.info('handler is triggered: start-test, event={}'.format(event))
     logger.info('Records count: {}'.format(len(event['Records'])))
     
@@ -49,7 +69,18 @@ def handle(event, context):
         message = json.loads(record['Sns']['Message'])
         interval_in_sec = int(message['Config']['IntervalInSec'])
         duration_in_sec = int(message['Config']['DurationInSec'])
+        # optional open-loop load mode
+        request_rate = message['Config'].get('RequestRate', None)
+        concurrency = int(message['Config'].get('Concurrency', 8))
+        # Replay mode: send the requests recorded by endpoint data capture, with their timing
+        mode = message['Config'].get('Mode', 'Loop')
         logger.info('handler start one-record, message={}'.format(message))
+        # switch per-request logs on for this test only, e.g. to debug a failing test case
+        log_setup.set_verbose(message['Config'].get('LogVerbose', os.environ.get('LOG_VERBOSE', 'false').lower() == 'true'))
+
+        if mode in _single_client_modes and int(os.environ.get('TEST_CLIENT_INDEX', '0')) != 0:
+            logger.info('handler skip one-record: {} runs on the first tester client only'.format(mode))
+            continue
 
         api_gateway_tester = tester.HttpRequestTester(
             TestName='ApiGateway',
@@ -59,8 +90,36 @@ def handle(event, context):
             Endpoint=api_endpoint,
             ApiKey=None,
             Interval=interval_in_sec,
-            Duration=duration_in_sec
+            Duration=duration_in_sec,
+            Rate=float(request_rate) if request_rate is not None else None,
+            Concurrency=concurrency
             )
-        api_gateway_tester.start_loop(message['TestData'])
+        if mode == 'VariantComparison':
+            # bypasses API Gateway: the same TestData goes to every variant of SAGEMAKER_ENDPOINT
+            variants = message['Config'].get('Variants', [variant['VariantName'] for variant in json.loads(os.environ.get('VARIANTS', '[]'))])
+            sm_client = tester.Boto3Loader(profile_name).get_client('sagemaker-runtime')
+            variant_comparison.compare_variants(sm_client, os.environ.get('SAGEMAKER_ENDPOINT'), variants,
+                                                [data['request'] for data in message['TestData']],
+                                                concurrency=concurrency,
+                                                repeat=int(message['Config'].get('Repeat', 10)))
+        elif mode == 'CapacitySearch':
+            # VARIANTS: VariantName/VariantWeight/InstanceCount of ModelServing ModelList
+            variants = json.loads(os.environ.get('VARIANTS', '[]'))
+            capacity_search.run_capacity_search(api_gateway_tester, message['TestData'], variants,
+                                                start_rate=float(message['Config'].get('StartRate', 10)),
+                                                max_rate=float(message['Config'].get('MaxRate', 1000)),
+                                                slo_p99_in_ms=float(message['Config']['SloP99InMs']),
+                                                slo_error_rate=float(message['Config'].get('SloErrorRate', 0.001)),
+                                                stage_duration=float(message['Config'].get('StageDurationInSec', 30)),
+                                                safety_factor=float(message['Config'].get('SafetyFactor', 0.7)))
+        elif mode == 'Replay':
+            replay_source = message['Config'].get('ReplaySource', os.environ.get('DATA_CAPTURE_URI', None))
+            max_gap_in_sec = message['Config'].get('ReplayMaxGapInSec', None)
+            traffic_replay.replay(api_gateway_tester, replay_source,
+                                  speedup=float(message['Config'].get('ReplaySpeedup', 1.0)),
+                                  max_gap_in_sec=float(max_gap_in_sec) if max_gap_in_sec is not None else None,
+                                  check_response=message['Config'].get('ReplayCheckResponse', False))
+        else:
+            api_gateway_tester.start_loop(message['TestData'])
 
         logger.info('handler finish one record: test-timeout duration_in_sec-{}'.format(duration_in_sec))
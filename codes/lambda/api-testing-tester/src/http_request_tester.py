@@ -23,12 +23,17 @@ import enum
 import datetime
 import random
 import json
+import queue
 import threading
+import collections
 import http.client
 import logging
 
 import boto3
-from botocore.exceptions import ClientError
+
+import log_setup
+import metric_sink
+import latency_histogram
 
 logger = logging.getLogger()
 
@@ -66,6 +71,10 @@ class Key(enum.Enum):
     ApiKey       = 'ApiKey'
     Interval     = 'Interval'
     Duration     = 'Duration'
+    Rate         = 'Rate'
+    Concurrency  = 'Concurrency'
+    UseHttps     = 'UseHttps'
+    MetricSink   = 'MetricSink'
 
 
 class MetricType(enum.Enum):
@@ -79,9 +88,11 @@ class MetricType(enum.Enum):
 class HttpRequestTester:
 
     def __init__(self, **kwarg):
-        profile_name  = kwarg[Key.ProfileName.value]
-        boto3_loader = Boto3Loader(profile_name)
-        self.cloudwatch = boto3_loader.get_client('cloudwatch')
+        self.metric_sink = kwarg.get(Key.MetricSink.value, None)
+        if self.metric_sink is None:
+            profile_name  = kwarg[Key.ProfileName.value]
+            boto3_loader = Boto3Loader(profile_name)
+            self.metric_sink = metric_sink.CloudWatchMetricSink(boto3_loader.get_client('cloudwatch'))
 
         self.test_name  = kwarg[Key.TestName.value]
         self.project_name  = kwarg[Key.ProjectName.value]
@@ -91,53 +102,51 @@ class HttpRequestTester:
         self.interval = kwarg[Key.Interval.value]
         self.duration = kwarg[Key.Duration.value]
 
+        # open-loop load mode: requests per second and number of keep-alive connections
+        self.rate = kwarg.get(Key.Rate.value, None)
+        self.concurrency = kwarg.get(Key.Concurrency.value, 8)
+        self.use_https = kwarg.get(Key.UseHttps.value, True)
+        self._local = threading.local()
+
+        self._histograms = {}
+        self._errors = collections.Counter()
+        self._report_lock = threading.Lock()
+
 
     def put_metric(self, metric_type, data_value, namespace, project_stage, type):
-        try:
-            if metric_type == MetricType.ResponseTime:
-                self.cloudwatch.put_metric_data(
-                    MetricData=[
-                        {
-                            'MetricName': metric_type.value,
-                            'Dimensions': [
-                                {
-                                    'Name': 'Stage',
-                                    'Value': project_stage
-                                },
-                                {
-                                    'Name': 'Type',
-                                    'Value': type
-                                },
-                            ],
-                            'Unit': 'Milliseconds',
-                            'Value': data_value
-                        },
-                    ],
-                    Namespace=namespace
-                )
-            else:
-                self.cloudwatch.put_metric_data(
-                    MetricData=[
-                        {
-                            'MetricName': metric_type.value,
-                            'Dimensions': [
-                                {
-                                    'Name': 'Stage',
-                                    'Value': project_stage
-                                },
-                                {
-                                    'Name': 'Type',
-                                    'Value': type
-                                },
-                            ],
-                            'Unit': 'Count',
-                            'Value': data_value
-                        },
-                    ],
-                    Namespace=namespace
-                )
-        except ClientError:
-            logger.info('Fail: put metric - {}'.format(ClientError))
+        dimensions = [
+            {
+                'Name': 'Stage',
+                'Value': project_stage
+            },
+            {
+                'Name': 'Type',
+                'Value': type
+            },
+        ]
+        unit = 'Milliseconds' if metric_type == MetricType.ResponseTime else 'Count'
+        self.metric_sink.put(namespace, metric_type.value, unit, data_value, dimensions)
+
+
+    def record_latency(self, type, latency_in_ms, error):
+        with self._report_lock:
+            histogram = self._histograms.get(type)
+            if histogram is None:
+                histogram = self._histograms[type] = latency_histogram.LatencyHistogram()
+            histogram.record(latency_in_ms)
+            if error:
+                self._errors[type] += 1
+
+
+    def reset_report(self):
+        with self._report_lock:
+            self._histograms = {}
+            self._errors = collections.Counter()
+
+
+    def build_report(self, duration_in_sec):
+        with self._report_lock:
+            return latency_histogram.build_report(self._histograms, self._errors, duration_in_sec)
 
 
     def load_test_list(self, data_file):
@@ -147,7 +156,44 @@ class HttpRequestTester:
         return list
 
 
-    def request_post(self, type, endpoint, url, key, token, body):
+    def get_connection(self, endpoint):
+        # one keep-alive connection per thread and endpoint
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+
+        conn = connections.get(endpoint)
+        if conn is None:
+            if self.use_https:
+                conn = http.client.HTTPSConnection(endpoint)
+            else:
+                conn = http.client.HTTPConnection(endpoint)
+            connections[endpoint] = conn
+        return conn
+
+
+    def close_connection(self, endpoint):
+        connections = getattr(self._local, 'connections', {})
+        conn = connections.pop(endpoint, None)
+        if conn is not None:
+            conn.close()
+
+
+    def send_post(self, endpoint, url, payload, headers):
+        for attempt in range(2):
+            conn = self.get_connection(endpoint)
+            try:
+                conn.request("POST", url, payload, headers)
+                response = conn.getresponse()
+                return response.status, response.read().decode("utf-8")
+            except (http.client.HTTPException, ConnectionError) as e:
+                # the server may close an idle keep-alive connection, so reconnect once
+                self.close_connection(endpoint)
+                if attempt > 0:
+                    raise e
+
+
+    def request_post(self, type, endpoint, url, key, token, body, scheduled_time=None):
         headers = {
                 'content-type': 'application/json',
             }
@@ -158,66 +204,156 @@ class HttpRequestTester:
 
         payload = json.dumps(body)
 
-        logger.info('request_post: request - endpoint - {}'.format(endpoint))
-        before = time.time()
-        conn = http.client.HTTPSConnection(endpoint)
-        conn.request("POST", url, payload, headers)
-        after = time.time()
-
-        response = conn.getresponse()
-        body_str = response.read().decode("utf-8")
-        logger.info('request_post: response - status_code - {}'.format(response.status))
+        logger.debug('request_post: request - endpoint - %s', endpoint)
+        before = time.perf_counter() if scheduled_time is None else scheduled_time
+        try:
+            status, body_str = self.send_post(endpoint, url, payload, headers)
+        except (http.client.HTTPException, OSError) as e:
+            logger.error('request_post: request failed - {}'.format(e))
+            status, body_str = 0, None
+        after = time.perf_counter()
 
-        if response.status is not 200:
+        if status != 200:
             response_body = None
+            logger.warning('request_post: response - status_code - {}'.format(status))
             self.put_metric(MetricType.StatusError, 1.0, self.project_name, self.project_stage, type)
         else:
             response_body = json.loads(body_str)
-            logger.info('request_post: response - body - {}'.format(response_body))
+            logger.debug('request_post: response - body - %s', response_body)
             self.put_metric(MetricType.StatusSuccess, 1.0, self.project_name, self.project_stage, type)
         
-        logger.info('request_post: response time - {}'.format(after - before))
-        self.put_metric(MetricType.ResponseTime, (after * 1000 - before * 1000), self.project_name, self.project_stage, type)
-        return response.status, response_body
+        logger.info('request_post: response - status_code - {}, time - {:.3f}'.format(status, after - before))
+        self.put_metric(MetricType.ResponseTime, (after - before) * 1000, self.project_name, self.project_stage, type)
+        self.record_latency(type, (after - before) * 1000, status != 200)
+        return status, response_body
+
+
+    def check_response(self, data, response):
+        expected_keys = data['response'].keys()
+        result_keys = response.keys()
+        for expected_key in expected_keys:
+            if expected_key in result_keys:
+                if not response[expected_key] == data['response'][expected_key]:
+                    logger.error('start_request_with_timer: response compare - {} != {}'.format(response[expected_key], data['response'][expected_key]))
+                    return False
+            else:
+                logger.error('start_request_with_timer: response empty')
+                return False
+        return True
 
 
-    def execute_tests(self, test_list):
-        for data in test_list:
+    def execute_test(self, data, scheduled_time=None):
+        # closed-loop tests run on the handler thread, so give its sampling decision back afterwards
+        sampled = log_setup.is_sampled()
+        log_setup.begin_request()
+        try:
             body = data['request']
             type = '{}/{}'.format(self.test_name, data['type'])
             resource = '/{}/{}'.format(self.project_stage, data['resource'])
-            
-            status, response = self.request_post(type, self.endpoint, resource, None, None, body)
+
+            status, response = self.request_post(type, self.endpoint, resource, None, None, body, scheduled_time)
             if response is not None:
-                expected_keys = data['response'].keys()
-                result_keys = response.keys()
-                success = True
-                for expected_key in expected_keys:
-                    if expected_key in result_keys:
-                        if not response[expected_key] == data['response'][expected_key]:
-                            success = False
-                            logger.error('start_request_with_timer: response compare - {} != {}'.format(response[expected_key], data['response'][expected_key]))
-                            break    
-                    else:
-                        success = False
-                        logger.error('start_request_with_timer: response empty')
-                        break
-                
-                if success == True:
+                if self.check_response(data, response):
                     self.put_metric(MetricType.TestSuccess, 1.0, self.project_name, self.project_stage, type)
                 else:
                     self.put_metric(MetricType.TestFail, 1.0, self.project_name, self.project_stage, type)
+        finally:
+            log_setup.begin_request(sampled)
+
+
+    def execute_tests(self, test_list):
+        for data in test_list:
+            self.execute_test(data)
             time.sleep(data['interval'])
 
 
+    def build_rate_schedule(self, test_list, rate, duration):
+        # yields (offset_in_sec, test data) at a fixed request rate, cycling through test_list
+        index = 0
+        while index / rate < duration:
+            yield index / rate, test_list[index % len(test_list)]
+            index += 1
+
+
+    def run_open_loop(self, schedule, concurrency):
+        """Send requests at their scheduled offsets regardless of how many are still in flight.
+
+        Latency is measured from the scheduled send time, so time spent waiting for a free
+        connection is counted instead of being hidden by a slower request rate.
+        """
+        requests = queue.Queue()
+
+        def work():
+            while True:
+                item = requests.get()
+                if item is None:
+                    break
+                scheduled_time, data = item
+                try:
+                    self.execute_test(data, scheduled_time)
+                except Exception as e:
+                    logger.error('run_open_loop: test failed - {}'.format(e))
+            self.close_connection(self.endpoint)
+
+        workers = [threading.Thread(target=work, daemon=True) for _ in range(concurrency)]
+        for worker in workers:
+            worker.start()
+
+        start_time = time.perf_counter()
+        count = 0
+        for offset, data in schedule:
+            scheduled_time = start_time + offset
+            delay = scheduled_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            requests.put((scheduled_time, data))
+            count += 1
+
+        for _ in workers:
+            requests.put(None)
+        for worker in workers:
+            worker.join()
+
+        logger.info('run_open_loop: sent {} requests in {:.1f} sec'.format(count, time.perf_counter() - start_time))
+        return count
+
+
+    def start_load(self, test_list):
+        schedule = self.build_rate_schedule(test_list, self.rate, self.duration)
+        return self.run_open_loop(schedule, self.concurrency)
+
+
+    def run_with_report(self, run):
+        self.reset_report()
+        loop_start_time = time.perf_counter()
+        try:
+            run()
+        finally:
+            # stops the flush thread too, a later test on the same sink starts a new one
+            self.metric_sink.close()
+
+        report = self.build_report(time.perf_counter() - loop_start_time)
+        logger.info(json.dumps({'LatencyReport': report}), extra=log_setup.ALWAYS)
+        return report
+
+
+    def start_schedule(self, schedule):
+        # schedule: iterable of (offset_in_sec, test data), e.g. from traffic_replay.py
+        return self.run_with_report(lambda: self.run_open_loop(schedule, self.concurrency))
+
+
     def start_loop(self, test_list):
-        start_time = time.time()
+        def run():
+            if self.rate is not None:
+                self.start_load(test_list)
+            else:
+                start_time = time.time()
 
-        while True:
-            self.execute_tests(test_list)
-            if (time.time() - start_time) >= self.duration:
-                break
+                while True:
+                    self.execute_tests(test_list)
+                    if (time.time() - start_time) >= self.duration:
+                        break
 
-            time.sleep(self.interval)
+                    time.sleep(self.interval)
 
-        
+        return self.run_with_report(run)
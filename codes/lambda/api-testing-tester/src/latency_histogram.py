@@ -0,0 +1,176 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import sys
+import json
+import math
+import collections
+
+_percentiles = [('p50', 50.0), ('p90', 90.0), ('p99', 99.0), ('p99.9', 99.9)]
+
+
+class LatencyHistogram(object):
+    """Log-bucketed latency histogram with bounded memory.
+
+    Every recorded value is reported within relative_accuracy of its true value
+    (1% by default), whatever its magnitude. Histograms with the same accuracy
+    can be merged, so reports from several tester clients add up exactly.
+    """
+
+    def __init__(self, relative_accuracy=0.01, min_value=0.001, max_value=3600000.0):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+
+        self.buckets = collections.Counter()
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+
+    def record(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+        if value <= self.min_value:
+            self.zero_count += 1
+        else:
+            self.buckets[int(math.ceil(math.log(min(value, self.max_value)) / self._log_gamma))] += 1
+
+
+    def _bucket_value(self, index):
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+
+    def percentile(self, percent):
+        if self.count == 0:
+            return None
+
+        rank = percent / 100.0 * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return self.min
+        for index in sorted(self.buckets.keys()):
+            seen += self.buckets[index]
+            if rank < seen:
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+
+    def percentiles(self):
+        """The reported percentiles by name, e.g. {'p50': ..., 'p99': ...}."""
+        return {name: self.percentile(percent) for name, percent in _percentiles}
+
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise Exception('LatencyHistogram: cannot merge histograms with different accuracy')
+
+        self.buckets.update(other.buckets)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        if other.count > 0:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'buckets': {str(index): count for index, count in self.buckets.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max
+        }
+
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(relative_accuracy=data['relative_accuracy'])
+        histogram.buckets = collections.Counter({int(index): count for index, count in data['buckets'].items()})
+        histogram.zero_count = data['zero_count']
+        histogram.count = data['count']
+        histogram.sum = data['sum']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        return histogram
+
+
+def build_report(histograms, errors, duration_in_sec):
+    """Summarize per-type histograms(ms) and error counts of one or more tester runs."""
+    types = {}
+    for type, histogram in sorted(histograms.items()):
+        stats = {
+            'count': histogram.count,
+            'errors': errors.get(type, 0),
+            'error_rate': errors.get(type, 0) / histogram.count if histogram.count > 0 else 0.0,
+            'throughput': histogram.count / duration_in_sec if duration_in_sec > 0 else 0.0
+        }
+        stats.update(histogram.percentiles())
+        stats['max'] = histogram.max
+        types[type] = stats
+
+    return {
+        'duration_in_sec': duration_in_sec,
+        'types': types,
+        'errors': dict(errors),
+        'histograms': {type: histogram.to_dict() for type, histogram in histograms.items()}
+    }
+
+
+def merge_reports(reports):
+    """Merge reports of concurrent tester clients into one, as if a single client had sent everything."""
+    histograms = {}
+    errors = collections.Counter()
+    duration_in_sec = 0.0
+    for report in reports:
+        for type, data in report['histograms'].items():
+            histogram = LatencyHistogram.from_dict(data)
+            if type in histograms:
+                histograms[type].merge(histogram)
+            else:
+                histograms[type] = histogram
+        errors.update(report['errors'])
+        duration_in_sec = max(duration_in_sec, report['duration_in_sec'])
+
+    return build_report(histograms, errors, duration_in_sec)
+
+
+if __name__ == '__main__':
+    # merge LatencyReport log lines exported from every tester client
+    #   python3 latency_histogram.py client-001.log client-002.log ...
+    reports = []
+    for path in sys.argv[1:]:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('{') and '"LatencyReport"' in line:
+                    reports.append(json.loads(line)['LatencyReport'])
+
+    merged = merge_reports(reports)
+    del merged['histograms']
+    print(json.dumps(merged, indent=4))
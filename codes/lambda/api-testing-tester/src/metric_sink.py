@@ -0,0 +1,155 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import threading
+import collections
+import logging
+
+from botocore.exceptions import ClientError, BotoCoreError
+
+logger = logging.getLogger()
+
+# CloudWatch limits: distinct values per datum, and datums per put_metric_data call
+_max_values_per_datum = 150
+_max_datums_per_call = 20
+
+
+class MetricSink(object):
+    """Destination of tester metrics. put() must be cheap because it runs on the request path."""
+
+    def put(self, namespace, metric_name, unit, value, dimensions):
+        raise NotImplementedError
+
+
+    def flush(self):
+        pass
+
+
+    def close(self):
+        self.flush()
+
+
+class InMemoryMetricSink(MetricSink):
+    """Keeps every data point in memory, for tests."""
+
+    def __init__(self):
+        self.data = []
+        self._lock = threading.Lock()
+
+
+    def put(self, namespace, metric_name, unit, value, dimensions):
+        with self._lock:
+            self.data.append({
+                'Namespace': namespace,
+                'MetricName': metric_name,
+                'Unit': unit,
+                'Value': value,
+                'Dimensions': dimensions
+            })
+
+
+    def values(self, metric_name):
+        with self._lock:
+            return [datum['Value'] for datum in self.data if datum['MetricName'] == metric_name]
+
+
+class CloudWatchMetricSink(MetricSink):
+    """Buffers data points and publishes them in bulk from a background thread.
+
+    Points with the same namespace, name, unit and dimensions are aggregated into
+    Values/Counts arrays, and a flush happens every flush_interval_in_sec or as soon as
+    max_buffer_size points are waiting. The thread starts with the first put() and ends in
+    close(), so a sink kept by a warm Lambda does not leave a thread behind per test.
+    """
+
+    def __init__(self, cloudwatch, flush_interval_in_sec=10.0, max_buffer_size=1000, value_precision=1):
+        self.cloudwatch = cloudwatch
+        self.flush_interval_in_sec = flush_interval_in_sec
+        self.max_buffer_size = max_buffer_size
+        self.value_precision = value_precision
+
+        self._buffer = collections.defaultdict(collections.Counter)
+        self._buffer_size = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = None
+        self._thread = None
+
+
+    def put(self, namespace, metric_name, unit, value, dimensions):
+        key = (namespace, metric_name, unit, tuple((dimension['Name'], dimension['Value']) for dimension in dimensions))
+        with self._lock:
+            self._buffer[key][round(value, self.value_precision)] += 1
+            self._buffer_size += 1
+            if self._thread is None:
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stop,), daemon=True)
+                self._thread.start()
+            if self._buffer_size >= self.max_buffer_size:
+                self._wakeup.set()
+
+
+    def _run(self, stop):
+        while not stop.is_set():
+            self._wakeup.wait(self.flush_interval_in_sec)
+            self._wakeup.clear()
+            self.flush()
+
+
+    def _take_buffer(self):
+        with self._lock:
+            buffer = self._buffer
+            self._buffer = collections.defaultdict(collections.Counter)
+            self._buffer_size = 0
+        return buffer
+
+
+    def flush(self):
+        with self._flush_lock:
+            metric_data = collections.defaultdict(list)
+            for (namespace, metric_name, unit, dimensions), counter in self._take_buffer().items():
+                items = sorted(counter.items())
+                for start in range(0, len(items), _max_values_per_datum):
+                    chunk = items[start:start + _max_values_per_datum]
+                    metric_data[namespace].append({
+                        'MetricName': metric_name,
+                        'Dimensions': [{'Name': name, 'Value': value} for name, value in dimensions],
+                        'Unit': unit,
+                        'Values': [value for value, _ in chunk],
+                        'Counts': [float(count) for _, count in chunk]
+                    })
+
+            for namespace, data in metric_data.items():
+                for start in range(0, len(data), _max_datums_per_call):
+                    try:
+                        self.cloudwatch.put_metric_data(MetricData=data[start:start + _max_datums_per_call], Namespace=namespace)
+                    except (ClientError, BotoCoreError) as e:
+                        # BotoCoreError: connection errors or timeouts, which must not end the flush thread
+                        logger.info('Fail: put metric - {}'.format(e))
+
+
+    def close(self):
+        with self._lock:
+            thread, stop = self._thread, self._stop
+            self._thread = self._stop = None
+        if thread is not None:
+            stop.set()
+            self._wakeup.set()
+            thread.join()
+        self.flush()
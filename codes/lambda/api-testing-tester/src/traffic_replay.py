@@ -0,0 +1,225 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Replays production traffic recorded by SageMaker data capture(DataLoggingEnable in app-config.json).
+
+Capture files are JSON lines; each line holds one request/response pair:
+  {"captureData": {"endpointInput": {"data": ..., "encoding": "JSON"|"BASE64", ...},
+                   "endpointOutput": {...}},
+   "eventMetadata": {"eventId": ..., "inferenceTime": "2021-01-17T07:07:36Z"}, ...}
+
+Files are streamed line by line from a local directory or an S3 prefix, and the requests are
+sent through HttpRequestTester.run_open_loop with their recorded inter-arrival times.
+"""
+
+import os
+import sys
+import json
+import heapq
+import base64
+import datetime
+import argparse
+import logging
+
+logger = logging.getLogger()
+
+
+def iter_local_lines(path):
+    if os.path.isfile(path):
+        file_list = [path]
+    else:
+        file_list = []
+        for dir_path, _, file_names in os.walk(path):
+            file_list.extend(os.path.join(dir_path, name) for name in file_names if name.endswith('.jsonl'))
+
+    # capture files are partitioned by yyyy/mm/dd/hh, so the path order is the time order
+    for file_path in sorted(file_list):
+        with open(file_path, 'rb') as f:
+            for line in f:
+                yield line
+
+
+def iter_s3_lines(s3_client, s3_uri):
+    bucket, _, prefix = s3_uri[len('s3://'):].partition('/')
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for item in sorted(page.get('Contents', []), key=lambda item: item['Key']):
+            if not item['Key'].endswith('.jsonl'):
+                continue
+            body = s3_client.get_object(Bucket=bucket, Key=item['Key'])['Body']
+            for line in body.iter_lines():
+                yield line
+
+
+def iter_source_lines(source, s3_client=None):
+    if not isinstance(source, str) or len(source) == 0:
+        raise Exception('traffic_replay: no replay source, set ReplaySource in Config or DATA_CAPTURE_URI')
+    if source.startswith('s3://'):
+        if s3_client is None:
+            import boto3
+            s3_client = boto3.client('s3')
+        return iter_s3_lines(s3_client, source)
+    return iter_local_lines(source)
+
+
+def parse_inference_time(value):
+    for time_format in ('%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%SZ'):
+        try:
+            return datetime.datetime.strptime(value, time_format).replace(tzinfo=datetime.timezone.utc).timestamp()
+        except ValueError:
+            pass
+    raise ValueError('unknown inferenceTime format: {}'.format(value))
+
+
+def decode_capture_data(capture):
+    if capture is None:
+        return None
+    data = capture['data']
+    if capture.get('encoding', 'JSON').upper() == 'BASE64':
+        data = base64.b64decode(data).decode('utf-8')
+    return json.loads(data)
+
+
+def parse_capture_line(line):
+    """Returns (inference timestamp in sec, request body, response body or None)."""
+    record = json.loads(line)
+    capture_data = record['captureData']
+    return (parse_inference_time(record['eventMetadata']['inferenceTime']),
+            decode_capture_data(capture_data['endpointInput']),
+            decode_capture_data(capture_data.get('endpointOutput')))
+
+
+def iter_capture_records(lines, reorder_window=1000):
+    """Yields parsed records in time order.
+
+    Capture files are written in parallel by every instance, so the lines are only roughly
+    ordered; a bounded heap puts them back in order without holding a whole file in memory.
+    """
+    heap = []
+    sequence = 0
+    for line in lines:
+        if len(line.strip()) == 0:
+            continue
+        try:
+            timestamp, request, response = parse_capture_line(line)
+        except (ValueError, KeyError) as e:
+            logger.error('iter_capture_records: skip malformed line - {}'.format(e))
+            continue
+
+        heapq.heappush(heap, (timestamp, sequence, request, response))
+        sequence += 1
+        if len(heap) > reorder_window:
+            timestamp, _, request, response = heapq.heappop(heap)
+            yield timestamp, request, response
+
+    while len(heap) > 0:
+        timestamp, _, request, response = heapq.heappop(heap)
+        yield timestamp, request, response
+
+
+def to_test_data(request, response, resource, check_response):
+    return {
+        'type': 'replay',
+        'resource': resource,
+        'request': request,
+        # the recorded response becomes the expected one, e.g. to compare a new model against production
+        'response': response if check_response and response is not None else {},
+        'interval': 0
+    }
+
+
+def build_replay_schedule(records, speedup=1.0, max_gap_in_sec=None, duration=None,
+                          resource='text', check_response=False):
+    """Yields (offset_in_sec, test data) for run_open_loop.
+
+    inferenceTime has whole-second precision, so events of the same second are spread evenly
+    over that second instead of being sent as one burst. Offsets are divided by speedup, and
+    idle gaps longer than max_gap_in_sec(recorded time) are shortened to it.
+    """
+    replay_time = 0.0
+    previous_second = None
+    group = []
+
+    def flush(group, base):
+        for index, (request, response) in enumerate(group):
+            yield (base + index / len(group)) / speedup, to_test_data(request, response, resource, check_response)
+
+    for timestamp, request, response in records:
+        if previous_second is not None and timestamp != previous_second:
+            if duration is not None and replay_time / speedup >= duration:
+                return
+            yield from flush(group, replay_time)
+            gap = timestamp - previous_second
+            if max_gap_in_sec is not None:
+                gap = min(gap, max_gap_in_sec)
+            replay_time += gap
+            group = []
+        previous_second = timestamp
+        group.append((request, response))
+
+    if len(group) > 0 and (duration is None or replay_time / speedup < duration):
+        yield from flush(group, replay_time)
+
+
+def replay(request_tester, source, speedup=1.0, max_gap_in_sec=None, resource='text',
+           check_response=False, s3_client=None):
+    records = iter_capture_records(iter_source_lines(source, s3_client))
+    schedule = build_replay_schedule(records, speedup, max_gap_in_sec, request_tester.duration,
+                                     resource, check_response)
+    return request_tester.start_schedule(schedule)
+
+
+if __name__ == '__main__':
+    # outside of Lambda, the shared modules are not in a layer
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'common', 'python'))
+    import http_request_tester as tester
+
+    logger.setLevel(logging.WARNING)
+    logger.addHandler(logging.StreamHandler(sys.stdout))
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', required=True, help='local directory/file or s3://bucket/prefix of data capture')
+    parser.add_argument('--endpoint', required=True, help='API endpoint host, e.g. xxxx.execute-api.us-east-2.amazonaws.com')
+    parser.add_argument('--project-name', default='TextClassification')
+    parser.add_argument('--project-stage', default='Demo')
+    parser.add_argument('--resource', default='text')
+    parser.add_argument('--speedup', type=float, default=1.0)
+    parser.add_argument('--max-gap', type=float, default=None, help='shorten recorded idle gaps to this many seconds')
+    parser.add_argument('--duration', type=float, default=None, help='stop after this many replay seconds')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--check-response', action='store_true')
+    parser.add_argument('--no-https', action='store_true')
+    parser.add_argument('--profile', default=None)
+    args = parser.parse_args()
+
+    request_tester = tester.HttpRequestTester(
+        TestName='Replay',
+        ProfileName=args.profile,
+        ProjectName=args.project_name,
+        ProjectStage=args.project_stage,
+        Endpoint=args.endpoint,
+        ApiKey=None,
+        Interval=0,
+        Duration=args.duration,
+        Concurrency=args.concurrency,
+        UseHttps=not args.no_https)
+    s3_client = tester.Boto3Loader(args.profile).get_client('s3') if args.source.startswith('s3://') else None
+    report = replay(request_tester, args.source, args.speedup, args.max_gap, args.resource,
+                    args.check_response, s3_client)
+    print(json.dumps(report, indent=4))
@@ -0,0 +1,200 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Compares the production variants of one endpoint on the same requests.
+
+Every request is sent to each variant through invoke_endpoint(TargetVariant=...). The calls
+are interleaved(request 1 to A and B, request 2 to B and A, ...) and run concurrently, so load
+and time-of-day effects hit all variants alike. The report has latency percentiles and
+throughput per variant, label agreement with the first(baseline) variant, and a Mann-Whitney
+U test of whether the latency distributions differ.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import itertools
+import argparse
+import threading
+import concurrent.futures
+import logging
+
+# outside of Lambda(the CLI below), the shared modules are not in a layer
+_common_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'common', 'python')
+if os.path.isdir(_common_dir):
+    sys.path.append(_common_dir)
+
+import log_setup
+import latency_histogram
+
+logger = logging.getLogger()
+
+
+def invoke_variant(client, endpoint_name, variant, request):
+    before = time.perf_counter()
+    try:
+        response = client.invoke_endpoint(
+            EndpointName=endpoint_name,
+            TargetVariant=variant,
+            ContentType='application/json',
+            Body=json.dumps(request))
+        prediction = json.loads(response['Body'].read().decode('utf-8'))
+    except Exception as e:
+        logger.error('invoke_variant: {} failed - {}'.format(variant, e))
+        prediction = None
+    return (time.perf_counter() - before) * 1000, prediction
+
+
+def get_labels(prediction):
+    if prediction is None or prediction.get('success') != 'true':
+        return None
+    if 'labels' in prediction:
+        return prediction['labels']
+    return [prediction['label']]
+
+
+def mann_whitney_u(first, second):
+    """Two-sided Mann-Whitney U test with the normal approximation and tie correction.
+
+    Returns (U of first, p-value, probability that a value of first is greater than one of second).
+    """
+    n1, n2 = len(first), len(second)
+    if n1 == 0 or n2 == 0:
+        return None, None, None
+
+    values = sorted([(value, 0) for value in first] + [(value, 1) for value in second])
+    ranks = [0.0] * len(values)
+    tie_sum = 0.0
+    index = 0
+    while index < len(values):
+        end = index
+        while end + 1 < len(values) and values[end + 1][0] == values[index][0]:
+            end += 1
+        for position in range(index, end + 1):
+            ranks[position] = (index + end) / 2.0 + 1
+        ties = end - index + 1
+        tie_sum += ties ** 3 - ties
+        index = end + 1
+
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, values) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2.0
+    n = n1 + n2
+    variance = n1 * n2 / 12.0 * ((n + 1) - tie_sum / (n * (n - 1))) if n > 1 else 0.0
+    if variance <= 0:
+        return u, 1.0, u / (n1 * n2)
+
+    z = (abs(u - n1 * n2 / 2.0) - 0.5) / math.sqrt(variance)
+    p_value = math.erfc(max(z, 0.0) / math.sqrt(2))
+    return u, p_value, u / (n1 * n2)
+
+
+def compare_variants(client, endpoint_name, variants, requests, concurrency=8, repeat=1, significance=0.05, seed=0):
+    tasks = []
+    shuffle = random.Random(seed)
+    for _ in range(repeat):
+        for index, request in enumerate(requests):
+            order = list(variants)
+            shuffle.shuffle(order)
+            tasks.extend((index, variant, request) for variant in order)
+
+    latencies = {variant: [] for variant in variants}
+    labels = {variant: {} for variant in variants}
+    errors = {variant: 0 for variant in variants}
+    lock = threading.Lock()
+
+    def run(task):
+        index, variant, request = task
+        latency, prediction = invoke_variant(client, endpoint_name, variant, request)
+        with lock:
+            latencies[variant].append(latency)
+            request_labels = get_labels(prediction)
+            if request_labels is None:
+                errors[variant] += 1
+            else:
+                labels[variant][index] = request_labels
+
+    start_time = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, tasks))
+    duration = time.perf_counter() - start_time
+
+    report = {'duration_in_sec': duration, 'requests': len(requests), 'repeat': repeat, 'variants': {}}
+    baseline = variants[0]
+    for variant in variants:
+        histogram = latency_histogram.LatencyHistogram()
+        for latency in latencies[variant]:
+            histogram.record(latency)
+        stats = {
+            'count': histogram.count,
+            'errors': errors[variant],
+            'error_rate': errors[variant] / histogram.count if histogram.count > 0 else 0.0,
+            'throughput': histogram.count / duration if duration > 0 else 0.0,
+            'mean': histogram.sum / histogram.count if histogram.count > 0 else None
+        }
+        stats.update(histogram.percentiles())
+
+        if variant != baseline:
+            compared = [index for index in labels[variant] if index in labels[baseline]]
+            agreed = sum(1 for index in compared if labels[variant][index] == labels[baseline][index])
+            stats['label_agreement'] = agreed / len(compared) if len(compared) > 0 else None
+
+            u, p_value, probability_slower = mann_whitney_u(latencies[variant], latencies[baseline])
+            stats['latency_test'] = {
+                'baseline': baseline,
+                'u': u,
+                'p_value': p_value,
+                'probability_slower': probability_slower,
+                'significant': p_value is not None and p_value < significance
+            }
+        report['variants'][variant] = stats
+
+    logger.info(json.dumps({'VariantComparison': report}), extra=log_setup.ALWAYS)
+    return report
+
+
+if __name__ == '__main__':
+    import traffic_replay
+    import http_request_tester as tester
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--endpoint-name', default='TextClassificationDemo-TextClassification-Endpoint')
+    parser.add_argument('--variants', required=True, help='comma-separated, the first one is the baseline, e.g. Model-A,Model-B')
+    parser.add_argument('--input', default=None, help='test list json with "request" items, e.g. input_data.json')
+    parser.add_argument('--source', default=None, help='or data capture directory/s3 prefix to take requests from')
+    parser.add_argument('--limit', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--profile', default=None)
+    args = parser.parse_args()
+
+    loader = tester.Boto3Loader(args.profile)
+    if args.input is not None:
+        with open(args.input) as f:
+            requests = [item['request'] for item in json.load(f)][:args.limit]
+    else:
+        s3_client = loader.get_client('s3') if args.source.startswith('s3://') else None
+        records = traffic_replay.iter_capture_records(traffic_replay.iter_source_lines(args.source, s3_client))
+        requests = [request for _, request, _ in itertools.islice(records, args.limit)]
+
+    report = compare_variants(loader.get_client('sagemaker-runtime'), args.endpoint_name,
+                              args.variants.split(','), requests, args.concurrency, args.repeat)
+    print(json.dumps(report, indent=4))
@@ -0,0 +1,122 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import os
+import sys
+import json
+import time
+import threading
+import http.server
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from test_http_request_tester import StandInHandler, create_tester, load_test_list
+
+import capacity_search
+import handler
+
+
+def start_limited_stand_in(instances, service_time_in_sec):
+    """Stand-in endpoint with a fixed capacity: instances / service_time requests per second."""
+    slots = threading.Semaphore(instances)
+
+    class LimitedStandInHandler(StandInHandler):
+        def do_POST(self):
+            with slots:
+                time.sleep(service_time_in_sec)
+            super().do_POST()
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), LimitedStandInHandler)
+    server.daemon_threads = True
+    server.connections = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_capacity_search():
+    # 2 instances x 20 requests/sec
+    server = start_limited_stand_in(instances=2, service_time_in_sec=0.05)
+    request_tester = create_tester(server, Concurrency=16)
+
+    variants = [
+        {'VariantName': 'Model-A', 'VariantWeight': 1, 'InstanceCount': 1},
+        {'VariantName': 'Model-B', 'VariantWeight': 1, 'InstanceCount': 1}
+    ]
+    result = capacity_search.run_capacity_search(request_tester, load_test_list(), variants,
+                                                 start_rate=10, max_rate=200, slo_p99_in_ms=150,
+                                                 stage_duration=1.0, safety_factor=0.5)
+    server.shutdown()
+
+    rates = [stage['rate'] for stage in result['stages']]
+    assert(rates[:3] == [10, 20, 40])
+    assert(not result['limited_by_max_rate'])
+    # a short stage cannot detect a slight overload, so allow some margin above the capacity(40)
+    assert(20 <= result['max_rate'] <= 50)
+    # every passing stage stays within the SLO
+    assert(all(stage['p99'] <= 150 for stage in result['stages'] if stage['passed']))
+    target = result['variants']['Model-A']
+    assert(target['InvocationsPerInstance'] == int(result['max_rate'] / 2 * 60 * 0.5))
+
+
+def test_capacity_below_start_rate():
+    # 1 instance x 5 requests/sec, already overloaded at start_rate
+    server = start_limited_stand_in(instances=1, service_time_in_sec=0.2)
+    request_tester = create_tester(server, Concurrency=16)
+
+    variants = [{'VariantName': 'Model-A', 'VariantWeight': 1, 'InstanceCount': 1}]
+    result = capacity_search.run_capacity_search(request_tester, load_test_list(), variants,
+                                                 start_rate=40, max_rate=200, slo_p99_in_ms=150,
+                                                 stage_duration=1.0)
+    server.shutdown()
+
+    assert(result['below_start_rate'])
+    assert(len(result['stages']) == 1)
+    assert(result['variants'] == {})
+
+
+def test_single_client_modes():
+    # every tester client receives the message, only the first one searches
+    message = {'Config': {'IntervalInSec': 0, 'DurationInSec': 1, 'Mode': 'CapacitySearch', 'SloP99InMs': 150},
+               'TestData': load_test_list()}
+    event = {'Records': [{'Sns': {'Message': json.dumps(message)}}]}
+    os.environ['TEST_CLIENT_INDEX'] = '1'
+    try:
+        before = time.perf_counter()
+        handler.handle_records(event)
+        assert(time.perf_counter() - before < 1.0)
+    finally:
+        del os.environ['TEST_CLIENT_INDEX']
+
+
+def test_recommend_targets():
+    variants = [
+        {'VariantName': 'Model-A', 'VariantWeight': 3, 'InstanceCount': 3},
+        {'VariantName': 'Model-B', 'VariantWeight': 1, 'InstanceCount': 2}
+    ]
+    targets = capacity_search.recommend_targets(100.0, variants, safety_factor=1.0)
+    assert(targets['Model-A']['InvocationsPerInstance'] == 1500)
+    assert(targets['Model-B']['InvocationsPerInstance'] == 750)
+
+    # a variant without instances gets no target instead of a ZeroDivisionError
+    targets = capacity_search.recommend_targets(100.0, [{'VariantName': 'Model-A', 'VariantWeight': 1, 'InstanceCount': 0}])
+    assert(targets['Model-A']['InvocationsPerInstance'] is None)
+
+
+if __name__ == '__main__':
+    test_capacity_search()
+    test_capacity_below_start_rate()
+    test_single_client_modes()
+    test_recommend_targets()
@@ -29,6 +29,7 @@ os.environ['DURATION_IN_SEC'] = '70'
 os.environ['INTERVAL_IN_SEC'] = '30'
 
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/src')
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/../../common/python')
 import handler
 
 
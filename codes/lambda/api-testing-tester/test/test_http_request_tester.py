@@ -0,0 +1,245 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import http.server
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/src')
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/../../common/python')
+import http_request_tester as tester
+import metric_sink
+import latency_histogram
+import log_setup
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Local stand-in for API Gateway: labels a sentence with its word count."""
+    protocol_version = 'HTTP/1.1'
+    delay_in_sec = 0.0
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(self.delay_in_sec)
+        body = json.dumps({'success': 'true', 'label': len(request['sentence'].split())}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.connections.add(self.client_address)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in(delay_in_sec=0.0):
+    handler_class = type('DelayedStandInHandler', (StandInHandler,), {'delay_in_sec': delay_in_sec})
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    server.daemon_threads = True
+    server.connections = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def create_tester(server, **kwarg):
+    request_tester = tester.HttpRequestTester(
+        TestName='Local',
+        ProfileName=None,
+        ProjectName='TextClassification',
+        ProjectStage='Test',
+        Endpoint='127.0.0.1:{}'.format(server.server_address[1]),
+        ApiKey=None,
+        Interval=0,
+        Duration=kwarg.pop('Duration', 1),
+        UseHttps=False,
+        MetricSink=metric_sink.InMemoryMetricSink(),
+        **kwarg)
+    return request_tester
+
+
+def load_test_list():
+    sentences = [
+        'Baseball is one of the most popular sports in the United States.',
+        'Stock investing has higher returns in the long run.'
+    ]
+    return [
+        {
+            'type': 'tc-{:03d}'.format(index + 1),
+            'resource': 'text',
+            'request': {'sentence': sentence},
+            'response': {'success': 'true', 'label': len(sentence.split())},
+            'interval': 0
+        } for index, sentence in enumerate(sentences)
+    ]
+
+
+def test_open_loop_load():
+    server = start_stand_in(delay_in_sec=0.05)
+    request_tester = create_tester(server, Rate=40, Concurrency=4, Duration=1)
+
+    before = time.perf_counter()
+    count = request_tester.start_load(load_test_list())
+    elapsed = time.perf_counter() - before
+    server.shutdown()
+
+    assert(count == 40)
+    assert(elapsed < 2.0)
+    assert(len(request_tester.metric_sink.values('TestSuccess')) == 40)
+    # keep-alive: connections are reused by the 4 workers
+    assert(len(server.connections) <= 4)
+
+
+def test_closed_loop_keeps_handler_sampling():
+    server = start_stand_in()
+    request_tester = create_tester(server)
+    sample_rate = log_setup._sample_rate
+    log_setup.set_sample_rate(0.0)
+    try:
+        log_setup.begin_request(sampled=True)
+        request_tester.execute_tests(load_test_list())
+        # the handler's per-record logs after the tests are still kept
+        assert(log_setup.is_sampled())
+    finally:
+        log_setup.set_sample_rate(sample_rate)
+        server.shutdown()
+
+
+def test_open_loop_latency_includes_queueing():
+    server = start_stand_in(delay_in_sec=0.1)
+    # one connection can serve 10 requests/sec, so 20 requests/sec must queue up
+    request_tester = create_tester(server, Rate=20, Concurrency=1, Duration=0.5)
+    request_tester.start_load(load_test_list())
+    server.shutdown()
+
+    latencies = request_tester.metric_sink.values('ResponseTime')
+    assert(len(latencies) == 10)
+    assert(max(latencies) > 400)
+
+
+class FakeCloudWatch(object):
+    def __init__(self):
+        self.calls = []
+
+    def put_metric_data(self, **kwargs):
+        self.calls.append(kwargs)
+
+
+def test_cloudwatch_sink_aggregates_points():
+    cloudwatch = FakeCloudWatch()
+    sink = metric_sink.CloudWatchMetricSink(cloudwatch, flush_interval_in_sec=60)
+    dimensions = [{'Name': 'Stage', 'Value': 'Test'}, {'Name': 'Type', 'Value': 'Local/tc-001'}]
+    for value in [10.0, 10.0, 12.5]:
+        sink.put('TextClassification', 'ResponseTime', 'Milliseconds', value, dimensions)
+    for _ in range(3):
+        sink.put('TextClassification', 'StatusSuccess', 'Count', 1.0, dimensions)
+    sink.close()
+
+    assert(len(cloudwatch.calls) == 1)
+    data = {datum['MetricName']: datum for datum in cloudwatch.calls[0]['MetricData']}
+    assert(data['ResponseTime']['Values'] == [10.0, 12.5])
+    assert(data['ResponseTime']['Counts'] == [2.0, 1.0])
+    assert(data['StatusSuccess']['Counts'] == [3.0])
+
+
+def test_cloudwatch_sink_flushes_on_size():
+    cloudwatch = FakeCloudWatch()
+    sink = metric_sink.CloudWatchMetricSink(cloudwatch, flush_interval_in_sec=60, max_buffer_size=5)
+    for _ in range(5):
+        sink.put('TextClassification', 'StatusSuccess', 'Count', 1.0, [])
+
+    deadline = time.time() + 2
+    while len(cloudwatch.calls) == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert(len(cloudwatch.calls) == 1)
+    sink.close()
+
+    # no flush thread is left behind between tests on a warm Lambda, the next put starts one
+    threads = threading.active_count()
+    sink.put('TextClassification', 'StatusSuccess', 'Count', 1.0, [])
+    assert(threading.active_count() == threads + 1)
+    sink.close()
+    assert(threading.active_count() == threads)
+    assert(len(cloudwatch.calls) == 2)
+
+
+class UnreachableCloudWatch(FakeCloudWatch):
+
+    def put_metric_data(self, **kwargs):
+        super().put_metric_data(**kwargs)
+        raise metric_sink.BotoCoreError()
+
+
+def test_cloudwatch_sink_survives_connection_errors():
+    cloudwatch = UnreachableCloudWatch()
+    sink = metric_sink.CloudWatchMetricSink(cloudwatch, flush_interval_in_sec=60, max_buffer_size=1)
+    sink.put('TextClassification', 'StatusSuccess', 'Count', 1.0, [])
+    deadline = time.time() + 2
+    while len(cloudwatch.calls) == 0 and time.time() < deadline:
+        time.sleep(0.01)
+
+    # the flush thread is still running and flushes the next point too
+    sink.put('TextClassification', 'StatusSuccess', 'Count', 1.0, [])
+    deadline = time.time() + 2
+    while len(cloudwatch.calls) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert(len(cloudwatch.calls) == 2)
+    sink.close()
+
+
+def test_histogram_percentiles():
+    histogram = latency_histogram.LatencyHistogram()
+    for value in range(1, 10001):
+        histogram.record(float(value))
+
+    assert(histogram.count == 10000)
+    assert(histogram.max == 10000.0)
+    for percent in [50.0, 90.0, 99.0, 99.9]:
+        expected = percent / 100.0 * 10000
+        assert(abs(histogram.percentile(percent) - expected) <= expected * 0.011)
+
+
+def test_merge_reports_of_clients():
+    reports = []
+    for client in range(5):
+        server = start_stand_in()
+        request_tester = create_tester(server, Rate=20, Concurrency=2, Duration=0.5)
+        reports.append(json.loads(json.dumps(request_tester.start_loop(load_test_list()))))
+        server.shutdown()
+
+    merged = latency_histogram.merge_reports(reports)
+    stats = merged['types']['Local/tc-001']
+    assert(stats['count'] == 5 * 5)
+    assert(stats['errors'] == 0)
+    assert(stats['p50'] <= stats['p99'] <= stats['max'])
+
+
+if __name__ == '__main__':
+    test_open_loop_load()
+    test_closed_loop_keeps_handler_sampling()
+    test_open_loop_latency_includes_queueing()
+    test_cloudwatch_sink_aggregates_points()
+    test_cloudwatch_sink_flushes_on_size()
+    test_cloudwatch_sink_survives_connection_errors()
+    test_histogram_percentiles()
+    test_merge_reports_of_clients()
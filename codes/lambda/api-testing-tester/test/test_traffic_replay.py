@@ -0,0 +1,113 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import shutil
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from test_http_request_tester import start_stand_in, create_tester
+
+import traffic_replay
+
+
+def capture_line(inference_time, sentence, encoding='JSON'):
+    data = json.dumps({'sentence': sentence})
+    output = json.dumps({'success': 'true', 'label': len(sentence.split())})
+    if encoding == 'BASE64':
+        data = base64.b64encode(data.encode('utf-8')).decode('utf-8')
+        output = base64.b64encode(output.encode('utf-8')).decode('utf-8')
+    return json.dumps({
+        'captureData': {
+            'endpointInput': {'observedContentType': 'application/json', 'mode': 'INPUT', 'data': data, 'encoding': encoding},
+            'endpointOutput': {'observedContentType': 'application/json', 'mode': 'OUTPUT', 'data': output, 'encoding': encoding}
+        },
+        'eventMetadata': {'eventId': 'event-id', 'inferenceTime': inference_time},
+        'eventVersion': '0'
+    })
+
+
+def write_capture_files(capture_dir):
+    # two hourly partitions; the second file is written out of order like parallel instances do
+    first_dir = os.path.join(capture_dir, 'AllTraffic', '2021', '01', '17', '07')
+    second_dir = os.path.join(capture_dir, 'AllTraffic', '2021', '01', '17', '08')
+    os.makedirs(first_dir)
+    os.makedirs(second_dir)
+    with open(os.path.join(first_dir, '00-00-000-a.jsonl'), 'w') as f:
+        for index in range(4):
+            f.write(capture_line('2021-01-17T07:59:58Z', 'short sentence number {}'.format(index)) + '\n')
+        f.write('not a capture line\n')
+    with open(os.path.join(second_dir, '00-00-000-b.jsonl'), 'w') as f:
+        f.write(capture_line('2021-01-17T08:00:00Z', 'a much longer sentence that was sent two seconds later', 'BASE64') + '\n')
+        f.write(capture_line('2021-01-17T07:59:59Z', 'one second later') + '\n')
+
+
+def test_replay_schedule():
+    capture_dir = tempfile.mkdtemp()
+    try:
+        write_capture_files(capture_dir)
+        records = list(traffic_replay.iter_capture_records(traffic_replay.iter_source_lines(capture_dir)))
+        schedule = list(traffic_replay.build_replay_schedule(iter(records), speedup=2.0))
+    finally:
+        shutil.rmtree(capture_dir)
+
+    assert(len(records) == 6)
+    assert([record[0] for record in records] == sorted(record[0] for record in records))
+    assert(records[-1][1]['sentence'].startswith('a much longer'))
+
+    offsets = [offset for offset, _ in schedule]
+    # 4 events of the same second are spread over it, then compressed 2x
+    assert(offsets == [0.0, 0.125, 0.25, 0.375, 0.5, 1.0])
+
+
+def test_replay_against_stand_in():
+    server = start_stand_in()
+    request_tester = create_tester(server, Concurrency=2, Duration=None)
+
+    capture_dir = tempfile.mkdtemp()
+    try:
+        write_capture_files(capture_dir)
+        before = time.perf_counter()
+        report = traffic_replay.replay(request_tester, capture_dir, speedup=4.0, check_response=True)
+        elapsed = time.perf_counter() - before
+    finally:
+        shutil.rmtree(capture_dir)
+        server.shutdown()
+
+    assert(report['types']['Local/replay']['count'] == 6)
+    assert(report['types']['Local/replay']['errors'] == 0)
+    assert(len(request_tester.metric_sink.values('TestSuccess')) == 6)
+    assert(0.5 <= elapsed < 2.0)
+
+
+def test_replay_without_source():
+    # neither ReplaySource nor DATA_CAPTURE_URI
+    try:
+        traffic_replay.iter_source_lines(None)
+        assert(False)
+    except Exception as e:
+        assert('ReplaySource' in str(e))
+
+
+if __name__ == '__main__':
+    test_replay_schedule()
+    test_replay_against_stand_in()
+    test_replay_without_source()
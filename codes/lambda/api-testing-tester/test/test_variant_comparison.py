@@ -0,0 +1,86 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/src')
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/../../common/python')
+import variant_comparison
+
+
+class StubSageMakerClient(object):
+    """Stands in for sagemaker-runtime: each variant has its own latency and labeling."""
+
+    def __init__(self, delays, label_funcs):
+        self.delays = delays
+        self.label_funcs = label_funcs
+        self.calls = []
+        self._lock = threading.Lock()
+
+
+    def invoke_endpoint(self, **kwargs):
+        variant = kwargs['TargetVariant']
+        sentence = json.loads(kwargs['Body'])['sentence']
+        with self._lock:
+            self.calls.append(variant)
+        time.sleep(self.delays[variant]())
+        body = json.dumps({'success': 'true', 'label': self.label_funcs[variant](sentence)})
+        return {'Body': io.BytesIO(body.encode('utf-8'))}
+
+
+def load_requests(count):
+    return [{'sentence': ' '.join(['word'] * (index % 4 + 1)) + ' {}'.format(index)} for index in range(count)]
+
+
+def test_compare_variants():
+    jitter = random.Random(3)
+    client = StubSageMakerClient(
+        delays={'Model-A': lambda: 0.002 + jitter.random() * 0.002, 'Model-B': lambda: 0.006 + jitter.random() * 0.002},
+        label_funcs={'Model-A': lambda sentence: len(sentence.split()),
+                     # disagrees on every 10th request
+                     'Model-B': lambda sentence: len(sentence.split()) + (1 if sentence.endswith('0') else 0)})
+
+    report = variant_comparison.compare_variants(client, 'endpoint', ['Model-A', 'Model-B'], load_requests(40),
+                                                 concurrency=4, repeat=2)
+
+    # interleaved: both variants got every request, alternating
+    assert(client.calls.count('Model-A') == client.calls.count('Model-B') == 80)
+    model_b = report['variants']['Model-B']
+    assert(model_b['label_agreement'] == 0.9)
+    assert(model_b['p50'] > report['variants']['Model-A']['p50'])
+    assert(model_b['latency_test']['significant'])
+    assert(model_b['latency_test']['probability_slower'] > 0.9)
+
+
+def test_mann_whitney_u():
+    # same distribution: not significant
+    u, p_value, _ = variant_comparison.mann_whitney_u([1, 2, 3, 4, 5, 6], [1, 2, 3, 4, 5, 6])
+    assert(u == 18 and p_value > 0.9)
+    # fully separated samples of 10: p ~ 0.0002
+    u, p_value, probability = variant_comparison.mann_whitney_u(list(range(10, 20)), list(range(10)))
+    assert(u == 100 and probability == 1.0 and p_value < 0.001)
+
+
+if __name__ == '__main__':
+    test_compare_variants()
+    test_mann_whitney_u()
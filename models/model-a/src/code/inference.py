@@ -16,81 +16,526 @@ OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
-import torch
-from torchtext.data.utils import get_tokenizer
-from torchtext.data.utils import ngrams_iterator
-
+import io
 import os
+import sys
 import json
+import time
 import logging
-
 import threading
-print('[INFO] load-thread id: {}'.format(threading.currentThread().getName()))
-print('[INFO] load-process id: {}'.format(os.getpid()))
-print('[INFO] load-SAGEMAKER_MODEL_SERVER_WORKERS: {}'.format(os.environ.get('SAGEMAKER_MODEL_SERVER_WORKERS', 'nonon')))
+import collections
+
+import log_setup
+import phase_timer
+import sentence_cache
+import vocab_index
+import model_registry
 
 logger = logging.getLogger(__name__)
 
+# non-blocking logs: INFO of only ENV_LOG_SAMPLE_RATE of the requests, warnings and errors always
+_log_sample_rate = float(os.environ.get('ENV_LOG_SAMPLE_RATE', '0.01'))
+_log_max_length = int(os.environ.get('ENV_LOG_MAX_LENGTH', '2000'))
+_log_verbose = os.environ.get('ENV_LOG_VERBOSE', 'false').lower() == 'true'
+
+# torch and torchtext are imported on first use by _load_dependencies()
+torch = None
+ngrams_iterator = None
+_tokenizer = None
+
 _model_file_name = 'model.pth'
+_torchscript_file_name = 'model.pt'
+_state_dict_file_name = 'model_state.pth'
 _vocab_file_name = 'vocab.pth'
+_vocab_index_file_name = 'vocab.idx'
+_use_vocab_index = os.environ.get('ENV_VOCAB_INDEX', 'true').lower() == 'true'
 _ngrams = int(os.environ.get('ENV_NGRAMS', '2'))
 
+# auto: model.pt(TorchScript) > model_state.pth(state_dict) > model.pth(pickled module)
+_model_format = os.environ.get('ENV_MODEL_FORMAT', 'auto').lower()
+_model_class_name = os.environ.get('ENV_MODEL_CLASS', 'TextClassificationModel')
+# dynamic int8 quantization at load time: none | linear | all(linear + embedding)
+_quantize = os.environ.get('ENV_QUANTIZE', 'none').lower()
+
+# intra-op threads of each worker; auto shares the CPUs between SAGEMAKER_MODEL_SERVER_WORKERS workers
+_threads_per_worker = os.environ.get('ENV_THREADS_PER_WORKER', 'auto').lower()
+
+_warmup_batches = int(os.environ.get('ENV_WARMUP_BATCHES', '2'))
+_warmup_batch_size = int(os.environ.get('ENV_WARMUP_BATCH_SIZE', '8'))
+_warmup_sentence = 'The new president has called for an emergency conference for international cooperation.'
+
+# multi-model hosting: every sub-directory of model_dir/models is a model chosen by "target_model"
+_multi_model_dir_name = 'models'
+_multi_model = os.environ.get('ENV_MULTI_MODEL', 'auto').lower()
+_default_model = os.environ.get('ENV_DEFAULT_MODEL', None)
+_model_memory_budget_bytes = int(os.environ.get('ENV_MODEL_MEMORY_BUDGET_BYTES', str(1024 * 1024 * 1024)))
+_vocab_entry_bytes = 128
+
 _content_type_json = 'application/json'
+_content_type_jsonlines = 'application/jsonlines'
+_jsonlines_accepts = (_content_type_jsonlines, _content_type_json, '*/*', '', None)
+_jsonlines_batch_size = int(os.environ.get('ENV_JSONLINES_BATCH_SIZE', '64'))
+
+# Per-worker cache: normalized sentence -> [n-gram id tensor, label or None]
+_cache_max_entries = int(os.environ.get('ENV_CACHE_MAX_ENTRIES', '10000'))
+_cache_max_bytes = int(os.environ.get('ENV_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+_cache_labels = os.environ.get('ENV_CACHE_LABELS', 'false').lower() == 'true'
+_tensor_overhead_bytes = 128
+
+
+def _sizeof_cache_item(item):
+    if isinstance(item, str):
+        return sys.getsizeof(item)
+    if isinstance(item, tuple):
+        return sys.getsizeof(item) + sum(sys.getsizeof(element) for element in item)
+    sentence_tensor = item[0]
+    return sys.getsizeof(item) + _tensor_overhead_bytes + sentence_tensor.element_size() * sentence_tensor.nelement()
+
+
+_cache = sentence_cache.LRUCache(_cache_max_entries, _cache_max_bytes, sizeof=_sizeof_cache_item)
+
+_startup_timings = {}
+
+# per-request phase timings: sampled requests are logged as CloudWatch EMF lines, and
+# ENV_RETURN_TIMINGS adds the timings to the JSON response for the caller(predictor Lambda)
+_timing_sample_rate = float(os.environ.get('ENV_TIMING_SAMPLE_RATE', '0.0'))
+_return_timings = os.environ.get('ENV_RETURN_TIMINGS', 'false').lower() == 'true'
+_timing_collector = phase_timer.EmfCollector(os.environ.get('ENV_TIMING_NAMESPACE', 'ModelServing'),
+                                             {'Component': 'Container'}, _timing_sample_rate)
+_request_state = threading.local()
+
+
+def set_timing_collector(collector):
+    global _timing_collector
+    _timing_collector = collector
+
+
+def _current_timer():
+    return getattr(_request_state, 'timer', phase_timer.NULL_TIMER)
+
+
+def get_startup_timings():
+    timings = dict(_startup_timings)
+    if 'models' in timings:
+        timings['models'] = {name: dict(model_timings) for name, model_timings in timings['models'].items()}
+    return timings
+
+
+def _load_dependencies():
+    global torch, ngrams_iterator, _tokenizer
+    if _tokenizer is not None:
+        return
+
+    before = time.perf_counter()
+    import torch
+    from torchtext.data.utils import get_tokenizer
+    from torchtext.data.utils import ngrams_iterator
+    _tokenizer = get_tokenizer("basic_english")
+    _startup_timings['import_ms'] = (time.perf_counter() - before) * 1000
+
+
+def _available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count()
+
+
+def get_thread_budget():
+    if _threads_per_worker != 'auto':
+        return max(1, int(_threads_per_worker))
+
+    cpus = _available_cpus()
+    workers = int(os.environ.get('SAGEMAKER_MODEL_SERVER_WORKERS', str(cpus)))
+    return max(1, cpus // max(1, workers))
+
+
+def _configure_threads():
+    threads = get_thread_budget()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # already set, or parallel work has started in this process
+        pass
+    logger.info('model_fn: intra-op threads per worker-{}'.format(threads))
+
+
+def _resolve_model_format(model_dir):
+    if _model_format != 'auto':
+        return _model_format
+    if os.path.exists(os.path.join(model_dir, _torchscript_file_name)):
+        return 'torchscript'
+    if os.path.exists(os.path.join(model_dir, _state_dict_file_name)):
+        return 'state_dict'
+    return 'pickle'
+
+
+def _load_model(model_dir):
+    model_format = _resolve_model_format(model_dir)
+    logger.info('model_fn: Loading the {} model artifact'.format(model_format))
+
+    if model_format == 'torchscript':
+        model = torch.jit.load(os.path.join(model_dir, _torchscript_file_name), map_location='cpu')
+    elif model_format == 'state_dict':
+        import model as model_module
+        state_dict = torch.load(os.path.join(model_dir, _state_dict_file_name), map_location='cpu')
+        vocab_size, embed_dim = state_dict['embedding.weight'].shape
+        num_class = state_dict['fc.weight'].shape[0]
+        model = getattr(model_module, _model_class_name)(vocab_size, embed_dim, num_class)
+        model.load_state_dict(state_dict)
+    elif model_format == 'pickle':
+        model = torch.load(os.path.join(model_dir, _model_file_name), map_location='cpu')
+    else:
+        raise Exception('model_fn: Requested unsupported model format in ENV_MODEL_FORMAT: ' + model_format)
+
+    model.eval()
+    if _quantize != 'none':
+        if model_format == 'torchscript':
+            logger.warning('model_fn: ENV_QUANTIZE is ignored for TorchScript, quantize it at packaging time instead')
+        else:
+            model = quantize_model(model, _quantize)
+    return model
+
+
+def quantize_model(model, mode):
+    _load_dependencies()
+    import torch.nn as nn
+
+    qconfig_spec = {nn.Linear: torch.quantization.default_dynamic_qconfig}
+    if mode == 'all':
+        qconfig_spec[nn.EmbeddingBag] = torch.quantization.float_qparams_weight_only_qconfig
+    elif mode != 'linear':
+        raise Exception('model_fn: Requested unsupported quantization in ENV_QUANTIZE: ' + mode)
+
+    logger.info('model_fn: Applying dynamic int8 quantization-{}'.format(mode))
+    return torch.quantization.quantize_dynamic(model, qconfig_spec)
+
+
+def _warm_up(model, dictionary):
+    # run full-size batches outside the cache so the first real request doesn't pay for allocator/dispatch warm-up
+    sentence_tensor = _sentence_to_tensor(_warmup_sentence, dictionary)
+    with torch.no_grad():
+        for _ in range(_warmup_batches):
+            _classify([sentence_tensor] * _warmup_batch_size, model)
+
+
+def _load_model_dict(model_dir, name=None):
+    # hosted models(multi-model mode) are loaded on demand, each keeps its own timings
+    timings = _startup_timings if name is None else _startup_timings.setdefault('models', {}).setdefault(name, {})
+
+    before = time.perf_counter()
+    model = _load_model(model_dir)
+    vocab_index_path = os.path.join(model_dir, _vocab_index_file_name)
+    if _use_vocab_index and os.path.exists(vocab_index_path):
+        logger.info('model_fn: Mapping the vocab index-{}'.format(vocab_index_path))
+        dictionary = vocab_index.MmapVocab(vocab_index_path)
+    else:
+        dictionary = torch.load(os.path.join(model_dir, _vocab_file_name))
+    timings['load_ms'] = (time.perf_counter() - before) * 1000
+
+    before = time.perf_counter()
+    _warm_up(model, dictionary)
+    timings['warmup_ms'] = (time.perf_counter() - before) * 1000
+
+    return {'model': model, 'dictionary': dictionary, 'name': name}
+
+
+def _sizeof_model_dict(model_dict):
+    model = model_dict['model']
+    size = sum(tensor.element_size() * tensor.nelement()
+               for tensor in list(model.parameters()) + list(model.buffers()))
+    # a memory-mapped vocab lives in the shared page cache, not in the worker heap
+    if not isinstance(model_dict['dictionary'], vocab_index.MmapVocab):
+        size += len(model_dict['dictionary']) * _vocab_entry_bytes
+    return size
+
 
-_tokenizer = get_tokenizer("basic_english")
+def _is_multi_model(model_dir):
+    if _multi_model == 'auto':
+        return os.path.isdir(os.path.join(model_dir, _multi_model_dir_name))
+    return _multi_model == 'true'
 
 
 def model_fn(model_dir):
-    print('[INFO] model_fn-thread id: {}'.format(threading.currentThread().getName()))
-    print('[INFO] model_fn-process id: {}'.format(os.getpid()))
+    # in model_fn, so the listener thread starts in the model server worker process
+    log_setup.setup_logging(logger, _log_sample_rate, _log_max_length, _log_verbose)
     logger.info('model_fn: Loading the model-{}'.format(model_dir))
+    logger.debug('model_fn: process id-{}, SAGEMAKER_MODEL_SERVER_WORKERS-{}'.format(
+        os.getpid(), os.environ.get('SAGEMAKER_MODEL_SERVER_WORKERS')))
 
     file_list = os.listdir(model_dir)
     logger.info("model_fn: model_dir list-{}".format(file_list))
 
-    model = torch.load(os.path.join(model_dir, _model_file_name))
-    dictionary = torch.load(os.path.join(model_dir, _vocab_file_name))
+    _load_dependencies()
+    _configure_threads()
 
-    return {'model': model, 'dictionary': dictionary}
+    if _is_multi_model(model_dir):
+        registry = model_registry.ModelRegistry(os.path.join(model_dir, _multi_model_dir_name),
+                                                _model_memory_budget_bytes, _load_model_dict, _sizeof_model_dict)
+        names = registry.names()
+        if len(names) == 0:
+            raise Exception('model_fn: no model directory in {}'.format(os.path.join(model_dir, _multi_model_dir_name)))
+        default_model = _default_model if _default_model is not None else names[0]
+        logger.info('model_fn: Hosting models-{}, default-{}'.format(names, default_model))
+        return {'registry': registry, 'default_model': default_model}
+
+    model_dict = _load_model_dict(model_dir)
+    logger.info('model_fn: startup timings-{}'.format(_startup_timings))
+    return model_dict
+
+
+def _select_model(model_dict, target_model):
+    if 'registry' not in model_dict:
+        return model_dict
+
+    registry = model_dict['registry']
+    return registry.get(target_model if target_model is not None else model_dict['default_model'])
+
+
+def get_registry_stats(model_dict):
+    return model_dict['registry'].stats() if 'registry' in model_dict else None
+
+
+class JsonLinesInput(object):
+    """Lazily parsed JSON Lines body: yields (sentence, target_model, None) or (None, None, error message) per line."""
+
+    def __init__(self, body):
+        self.body = body
+
+
+    def __iter__(self):
+        if isinstance(self.body, (bytes, bytearray)):
+            stream = io.BytesIO(self.body)
+        else:
+            stream = io.StringIO(self.body)
+
+        for line in stream:
+            if len(line.strip()) == 0:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                yield None, None, 'invalid JSON line: {}'.format(e)
+                continue
+
+            if not isinstance(item, dict) or not isinstance(item.get('sentence'), str):
+                yield None, None, 'line did not contain sentence'
+            else:
+                yield item['sentence'], item.get('target_model'), None
+
+
+class JsonLinesOutput(object):
+    """Predictions of a JsonLinesInput as JSON Lines text, one line per input line."""
+
+    def __init__(self, body):
+        self.body = body
+
+
+def _predict_jsonlines_batch(batch, model_dict):
+    results = [None] * len(batch)
+    # lines of the same target model are classified together
+    groups = collections.OrderedDict()
+    for index, (sentence, target_model, error) in enumerate(batch):
+        if error is not None:
+            results[index] = {'success': 'false', 'error': error}
+        else:
+            groups.setdefault(target_model, []).append(index)
+
+    for target_model, indexes in groups.items():
+        try:
+            selected = _select_model(model_dict, target_model)
+        except Exception as e:
+            for index in indexes:
+                results[index] = {'success': 'false', 'error': str(e)}
+            continue
+
+        labels = _predict_batch([batch[index][0] for index in indexes],
+                                selected['model'], selected['dictionary'], selected.get('name'))
+        for index, label in zip(indexes, labels):
+            results[index] = {'success': 'true', 'label': label}
+    return results
+
+
+def _write_jsonlines_batch(output, batch, model_dict):
+    for result in _predict_jsonlines_batch(batch, model_dict):
+        output.write(json.dumps(result))
+        output.write('\n')
+
+
+def _predict_jsonlines(lines, model_dict):
+    # only one batch of results is held as objects, the rest is already response text
+    output = io.StringIO()
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= _jsonlines_batch_size:
+            _write_jsonlines_batch(output, batch, model_dict)
+            batch = []
+    _write_jsonlines_batch(output, batch, model_dict)
+    return JsonLinesOutput(output.getvalue())
 
 
 def input_fn(serialized_input_data, content_type=_content_type_json):
+    # input_fn starts a request in the model server worker, output_fn ends it
+    log_setup.begin_request()
+    timer = _request_state.timer = _timing_collector.start(force=_return_timings)
+    with timer.span('input_fn'):
+        return _deserialize(serialized_input_data, content_type)
+
+
+def _deserialize(serialized_input_data, content_type):
     logger.info('input_fn: Deserializing the input data.')
 
+    if content_type == _content_type_jsonlines:
+        return JsonLinesInput(serialized_input_data)
+
     if content_type == _content_type_json:
         input_data = json.loads(serialized_input_data)
+        if 'sentences' in input_data:
+            sentences = input_data['sentences']
+            if not isinstance(sentences, list) or not all(isinstance(sentence, str) for sentence in sentences):
+                raise Exception('Requested input data contained sentences which is not a list of string')
+            return _with_target_model(input_data, sentences)
+
         if 'sentence' not in input_data:
             raise Exception('Requested input data did not contain sentence')
         
         sentence = input_data['sentence']
-        return sentence
+        return _with_target_model(input_data, sentence)
     
     raise Exception('Requested unsupported ContentType in content_type: ' + content_type)
 
 
-def predict_fn(sentence, model_dict):
-    logger.info('predict_fn: Predicting for {}.'.format(sentence))
+def _with_target_model(input_data, data):
+    if 'target_model' not in input_data:
+        return data
+    return {'target_model': input_data['target_model'], 'data': data}
+
+
+def _sentence_to_tensor(sentence, dictionary):
+    return torch.tensor([dictionary[token]
+                        for token in ngrams_iterator(_tokenizer(sentence), _ngrams)], dtype=torch.long)
+
+
+def _normalize_sentence(sentence):
+    # basic_english lower-cases first and ignores surrounding whitespace, so the ids are unchanged
+    return sentence.strip().lower()
+
+
+def _lookup_sentence(sentence, dictionary, model_name=None):
+    if not _cache.enabled():
+        return [_sentence_to_tensor(sentence, dictionary), None]
+
+    normalized = _normalize_sentence(sentence)
+    key = normalized if model_name is None else (model_name, normalized)
+    entry = _cache.get(key)
+    if entry is None:
+        entry = [_sentence_to_tensor(normalized, dictionary), None]
+        _cache.put(key, entry)
+    return entry
+
+
+def get_cache_stats():
+    return _cache.stats()
+
+
+def _classify(sentence_tensors, model):
+    lengths = torch.tensor([len(sentence_tensor) for sentence_tensor in sentence_tensors], dtype=torch.long)
+    offsets = torch.cat([torch.zeros(1, dtype=torch.long), lengths.cumsum(0)[:-1]])
+
+    output = model(torch.cat(sentence_tensors), offsets)
+    return (output.argmax(1) + 1).tolist()
+
+
+def _predict_batch(sentences, model, dictionary, model_name=None):
+    timer = _current_timer()
+    with timer.span('preprocess'):
+        entries = [_lookup_sentence(sentence, dictionary, model_name) for sentence in sentences]
+    labels = [entry[1] for entry in entries]
+
+    pending = [index for index, label in enumerate(labels) if label is None]
+    if len(pending) > 0:
+        with timer.span('forward'):
+            predicted = _classify([entries[index][0] for index in pending], model)
+        for index, label in zip(pending, predicted):
+            labels[index] = label
+            if _cache_labels:
+                entries[index][1] = label
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('predict_fn: cache stats {}.'.format(_cache.stats()))
+    return labels
+
+
+def predict_fn(input_data, model_dict):
+    with _current_timer().span('predict_fn'):
+        return _predict(input_data, model_dict)
+
+
+def _predict(input_data, model_dict):
+    logger.debug('predict_fn: Predicting for %s.', input_data)
+
+    if isinstance(input_data, JsonLinesInput):
+        with torch.no_grad():
+            return _predict_jsonlines(input_data, model_dict)
+
+    target_model = None
+    if isinstance(input_data, dict):
+        target_model = input_data['target_model']
+        input_data = input_data['data']
+    model_dict = _select_model(model_dict, target_model)
     
     model = model_dict['model']
     dictionary = model_dict['dictionary']
+    model_name = model_dict.get('name')
 
     with torch.no_grad():
-        sentence_tensor = torch.tensor([dictionary[token]
-                            for token in ngrams_iterator(_tokenizer(sentence), _ngrams)])
-        output = model(sentence_tensor, torch.tensor([0]))
-        label = output.argmax(1).item() + 1
-        logger.info('predict_fn: Prediction result is {}.'.format(label))
+        if isinstance(input_data, list):
+            if len(input_data) == 0:
+                return []
+            labels = _predict_batch(input_data, model, dictionary, model_name)
+            logger.debug('predict_fn: Prediction results are %s.', labels)
+            return labels
+
+        label = _predict_batch([input_data], model, dictionary, model_name)[0]
+        logger.debug('predict_fn: Prediction result is %s.', label)
         return label
         
 
-def output_fn(predicted_label, accept=_content_type_json):
+def output_fn(prediction, accept=_content_type_json):
+    timer = _current_timer()
+    _request_state.timer = phase_timer.NULL_TIMER
+    try:
+        with timer.span('output_fn'):
+            return _serialize(prediction, accept, timer)
+    finally:
+        _timing_collector.emit(timer)
+
+
+def _serialize(prediction, accept, timer):
     logger.info('output_fn: Serializing the generated output.')
 
+    if isinstance(prediction, JsonLinesOutput):
+        # the toolkit passes application/json when the request has no Accept(or */*),
+        # so JSON Lines input answers in JSON Lines unless another type is asked for
+        if accept not in _jsonlines_accepts:
+            raise Exception('output_fn: Requested unsupported ContentType in Accept for JSON Lines input: ' + accept)
+        return prediction.body, _content_type_jsonlines
+
     if accept == _content_type_json:
-        response = {
-            'success': 'true',
-            'label': predicted_label
-        }
+        if isinstance(prediction, list):
+            response = {
+                'success': 'true',
+                'labels': prediction
+            }
+        else:
+            response = {
+                'success': 'true',
+                'label': prediction
+            }
+        if _return_timings:
+            # output_fn itself is still running, so it is only in the EMF line
+            response['timings'] = timer.to_dict()
         return json.dumps(response), accept
     
     raise Exception('output_fn: Requested unsupported ContentType in Accept: ' + accept)
@@ -0,0 +1,90 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+import threading
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry(object):
+    """Lazily loaded models of one container, kept within a memory budget.
+
+    Each sub-directory of root_dir is one model artifact. A model is loaded on its first
+    request and shared by every later request of the worker; when the estimated memory of
+    the loaded models exceeds memory_budget_bytes, the least recently used ones are evicted.
+    """
+
+    def __init__(self, root_dir, memory_budget_bytes, loader, sizeof):
+        self.root_dir = root_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self.loader = loader
+        self.sizeof = sizeof
+
+        self.loads = 0
+        self.evictions = 0
+
+        self._models = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+
+    def names(self):
+        return sorted(name for name in os.listdir(self.root_dir)
+                      if os.path.isdir(os.path.join(self.root_dir, name)))
+
+
+    def get(self, name):
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                self._models.move_to_end(name)
+                return entry[0]
+
+            if name not in self.names():
+                raise Exception('Requested unknown target model: {}'.format(name))
+
+            model_dict = self.loader(os.path.join(self.root_dir, name), name)
+            size = self.sizeof(model_dict)
+            self.loads += 1
+
+            while len(self._models) > 0 and self._bytes + size > self.memory_budget_bytes:
+                evicted_name, (_, evicted_size) = self._models.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+                logger.info('ModelRegistry: evicted {}({} bytes)'.format(evicted_name, evicted_size))
+
+            if size > self.memory_budget_bytes:
+                logger.warning('ModelRegistry: {}({} bytes) alone exceeds the memory budget'.format(name, size))
+
+            self._models[name] = (model_dict, size)
+            self._bytes += size
+            logger.info('ModelRegistry: loaded {}({} bytes)'.format(name, size))
+            return model_dict
+
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': list(self._models.keys()),
+                'bytes': self._bytes,
+                'loads': self.loads,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,177 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+import sys
+import mmap
+import zlib
+import array
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Layout (little-endian):
+#   header   : magic, token count, hash table size, unknown-token id (-1 if none)
+#   offsets  : uint64[count + 1], start of each token in the string table
+#   ids      : int64[count], id of each token
+#   slots    : uint32[table size], open-addressing hash index (entry index + 1, 0 is empty)
+#   strings  : utf-8 tokens in sorted order
+_magic = b'VOCABIDX'
+_header = struct.Struct('<8sQQq')
+
+
+def _table_size(count):
+    size = 2
+    while size < count * 2:
+        size *= 2
+    return size
+
+
+def _little_endian(values):
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+
+_unknown_probe = '\x00<vocab-index-unknown-probe>\x00'
+
+
+def get_stoi(vocab):
+    """Return (token -> id mapping, unknown-token id or None) of a torchtext vocab or a plain dict."""
+    if hasattr(vocab, 'get_stoi'):
+        stoi = vocab.get_stoi()
+    elif hasattr(vocab, 'stoi'):
+        stoi = vocab.stoi
+    else:
+        stoi = vocab
+
+    # ask the vocab itself, so the index answers unknown tokens exactly like dictionary[token]
+    try:
+        unk_id = vocab[_unknown_probe]
+    except (KeyError, RuntimeError):
+        unk_id = None
+
+    return dict(stoi), unk_id
+
+
+def write_index(stoi, unk_id, index_path):
+    tokens = sorted(token.encode('utf-8') for token in stoi.keys())
+    table_size = _table_size(len(tokens))
+    mask = table_size - 1
+
+    offsets = array.array('Q', [0])
+    ids = array.array('q')
+    slots = array.array('I', [0]) * table_size
+    for index, token in enumerate(tokens):
+        offsets.append(offsets[-1] + len(token))
+        ids.append(stoi[token.decode('utf-8')])
+
+        slot = zlib.crc32(token) & mask
+        while slots[slot] != 0:
+            slot = (slot + 1) & mask
+        slots[slot] = index + 1
+
+    with open(index_path, 'wb') as f:
+        f.write(_header.pack(_magic, len(tokens), table_size, -1 if unk_id is None else unk_id))
+        f.write(_little_endian(offsets))
+        f.write(_little_endian(ids))
+        f.write(_little_endian(slots))
+        for token in tokens:
+            f.write(token)
+
+
+class MmapVocab(object):
+    """Read-only vocab backed by a memory-mapped index file.
+
+    The pages are shared through the OS page cache, so every model server worker
+    on the instance maps the same physical memory instead of holding its own dict.
+    """
+
+    def __init__(self, index_path):
+        if sys.byteorder != 'little':
+            raise Exception('MmapVocab: big-endian platforms are not supported')
+
+        with open(index_path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count, table_size, unk_id = _header.unpack_from(self._mm, 0)
+        if magic != _magic:
+            raise Exception('MmapVocab: {} is not a vocab index file'.format(index_path))
+        self.unk_id = None if unk_id < 0 else unk_id
+        self._mask = table_size - 1
+
+        view = memoryview(self._mm)
+        position = _header.size
+        self._offsets = view[position:position + 8 * (self.count + 1)].cast('Q')
+        position += 8 * (self.count + 1)
+        self._ids = view[position:position + 8 * self.count].cast('q')
+        position += 8 * self.count
+        self._slots = view[position:position + 4 * table_size].cast('I')
+        self._strings = position + 4 * table_size
+
+
+    def _find(self, token):
+        key = token.encode('utf-8')
+        slot = zlib.crc32(key) & self._mask
+        while True:
+            entry = self._slots[slot]
+            if entry == 0:
+                return None
+            index = entry - 1
+            if self._mm[self._strings + self._offsets[index]:self._strings + self._offsets[index + 1]] == key:
+                return self._ids[index]
+            slot = (slot + 1) & self._mask
+
+
+    def __getitem__(self, token):
+        token_id = self._find(token)
+        if token_id is not None:
+            return token_id
+        if self.unk_id is not None:
+            return self.unk_id
+        raise KeyError(token)
+
+
+    def __contains__(self, token):
+        return self._find(token) is not None
+
+
+    def __len__(self):
+        return self.count
+
+
+def convert(vocab_path, index_path):
+    import torch
+
+    stoi, unk_id = get_stoi(torch.load(vocab_path))
+    write_index(stoi, unk_id, index_path)
+
+    vocab = MmapVocab(index_path)
+    for token, token_id in stoi.items():
+        if vocab[token] != token_id:
+            raise Exception('convert: mismatched id for token {}'.format(token))
+    logger.info('convert: {} tokens written into {}({} bytes)'.format(len(vocab), index_path, os.path.getsize(index_path)))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 3:
+        print('usage: python3 vocab_index.py [vocab.pth] [vocab.idx]')
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2])
@@ -0,0 +1,169 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Micro-benchmark of the inference handler phases: input_fn, preprocessing(tokenization,
+n-gram and vocab lookup), model forward and output_fn, over several sentence lengths
+and batch sizes. Per-request CPU and wall time percentiles are written as JSON, and
+can be compared against a saved baseline to catch regressions before deploying.
+
+  python3 bench_handler.py --output bench_baseline.json
+  python3 bench_handler.py --compare bench_baseline.json --threshold 0.1
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import itertools
+
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/src/code')
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/../../codes/common/python')
+import inference as sm
+
+_phases = ['input_fn', 'preprocess', 'forward', 'output_fn', 'total']
+_metrics = ['cpu', 'wall']
+
+
+def make_sentence(words, length):
+    return ' '.join(itertools.islice(itertools.cycle(words), length))
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))]
+
+
+def _measure(function):
+    cpu_before = time.process_time_ns()
+    wall_before = time.perf_counter_ns()
+    result = function()
+    return result, time.process_time_ns() - cpu_before, time.perf_counter_ns() - wall_before
+
+
+def bench_case(model_dict, sentence, batch_size, iterations, warmup):
+    model = model_dict['model']
+    dictionary = model_dict['dictionary']
+    if batch_size == 1:
+        request = json.dumps({'sentence': sentence})
+    else:
+        request = json.dumps({'sentences': [sentence] * batch_size})
+
+    samples = {phase: {metric: [] for metric in _metrics} for phase in _phases}
+    with sm.torch.no_grad():
+        for iteration in range(warmup + iterations):
+            timings = {}
+            input_data, timings['input_fn_cpu'], timings['input_fn_wall'] = _measure(lambda: sm.input_fn(request, 'application/json'))
+            sentences = input_data if isinstance(input_data, list) else [input_data]
+            # the sentence cache is bypassed so that the real preprocessing cost is measured
+            tensors, timings['preprocess_cpu'], timings['preprocess_wall'] = _measure(
+                lambda: [sm._sentence_to_tensor(sentence, dictionary) for sentence in sentences])
+            labels, timings['forward_cpu'], timings['forward_wall'] = _measure(lambda: sm._classify(tensors, model))
+            prediction = labels if isinstance(input_data, list) else labels[0]
+            _, timings['output_fn_cpu'], timings['output_fn_wall'] = _measure(lambda: sm.output_fn(prediction, 'application/json'))
+
+            if iteration < warmup:
+                continue
+            for metric in _metrics:
+                total = 0
+                for phase in _phases[:-1]:
+                    samples[phase][metric].append(timings['{}_{}'.format(phase, metric)])
+                    total += timings['{}_{}'.format(phase, metric)]
+                samples['total'][metric].append(total)
+
+    result = {}
+    for phase in _phases:
+        result[phase] = {}
+        for metric in _metrics:
+            result[phase]['{}_p50_us'.format(metric)] = _percentile(samples[phase][metric], 50) / 1000.0
+            result[phase]['{}_p99_us'.format(metric)] = _percentile(samples[phase][metric], 99) / 1000.0
+    return result
+
+
+def run_benchmark(model_dict, words, lengths, batch_sizes, iterations, warmup):
+    results = {}
+    for length in lengths:
+        sentence = make_sentence(words, length)
+        for batch_size in batch_sizes:
+            case = 'length={},batch={}'.format(length, batch_size)
+            results[case] = bench_case(model_dict, sentence, batch_size, iterations, warmup)
+            print('[INFO] {:<24} total cpu p50 {:>10.1f} us, p99 {:>10.1f} us'.format(
+                case, results[case]['total']['cpu_p50_us'], results[case]['total']['cpu_p99_us']))
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'torch': sm.torch.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'iterations': iterations
+        },
+        'results': results
+    }
+
+
+def compare_results(baseline, current, threshold, metric='cpu', min_delta_us=5.0):
+    """Return the (case, phase, statistic, baseline, current) entries slower than baseline by more than threshold."""
+    regressions = []
+    for case, phases in current['results'].items():
+        if case not in baseline['results']:
+            continue
+        for phase, stats in phases.items():
+            for statistic in ['{}_p50_us'.format(metric), '{}_p99_us'.format(metric)]:
+                before = baseline['results'][case][phase][statistic]
+                after = stats[statistic]
+                if after > before * (1 + threshold) and after - before > min_delta_us:
+                    regressions.append((case, phase, statistic, before, after))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model-dir', default='./../src')
+    parser.add_argument('--lengths', type=int, nargs='+', default=[8, 32, 128, 512])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--output', default=None, help='write results into this JSON file')
+    parser.add_argument('--compare', default=None, help='baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown ratio, 0.1 = 10%%')
+    parser.add_argument('--metric', default='cpu', choices=_metrics)
+    args = parser.parse_args()
+
+    with open('./input_data.json') as f:
+        words = ' '.join(input['request']['sentence'] for input in json.load(f)).split()
+
+    model_dict = sm.model_fn(args.model_dir)
+    current = run_benchmark(model_dict, words, args.lengths, args.batch_sizes, args.iterations, args.warmup)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=4)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, current, args.threshold, args.metric)
+        for case, phase, statistic, before, after in regressions:
+            print('[REGRESSION] {} {} {}: {:.1f} us -> {:.1f} us ({:+.1f}%)'.format(
+                case, phase, statistic, before, after, (after / before - 1) * 100))
+        if len(regressions) > 0:
+            sys.exit(1)
+        print('[INFO] no regression beyond {:.0f}%'.format(args.threshold * 100))
@@ -0,0 +1,89 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Startup benchmark: measures module import, model/vocab load and warm-up time of inference.py
+in a fresh process per run, the same way a new model server worker starts.
+
+  python3 bench_startup.py --formats pickle torchscript --repeat 5
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+_code_dir = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/src/code'
+_common_dir = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/../../codes/common/python'
+
+_child_script = '''
+import sys, time, json
+before = time.perf_counter()
+sys.path.append({code_dir!r})
+sys.path.append({common_dir!r})
+import inference as sm
+module_ms = (time.perf_counter() - before) * 1000
+
+model_dict = sm.model_fn({model_dir!r})
+
+before = time.perf_counter()
+sm.output_fn(sm.predict_fn(sm.input_fn(json.dumps({{'sentence': 'Stock investing has higher returns in the long run.'}})), model_dict))
+first_request_ms = (time.perf_counter() - before) * 1000
+
+timings = sm.get_startup_timings()
+timings['module_ms'] = module_ms
+timings['first_request_ms'] = first_request_ms
+print(json.dumps(timings))
+'''
+
+
+def run_once(model_dir, model_format, warmup_batches):
+    env = dict(os.environ)
+    env['ENV_MODEL_FORMAT'] = model_format
+    env['ENV_WARMUP_BATCHES'] = str(warmup_batches)
+
+    script = _child_script.format(code_dir=_code_dir, common_dir=_common_dir, model_dir=model_dir)
+    output = subprocess.run([sys.executable, '-c', script], env=env, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench(model_dir, formats, repeat, warmup_batches):
+    report = {}
+    for model_format in formats:
+        runs = [run_once(model_dir, model_format, warmup_batches) for _ in range(repeat)]
+        report[model_format] = {key: statistics.median(run[key] for run in runs) for key in runs[0].keys()}
+
+    columns = ['module_ms', 'import_ms', 'load_ms', 'warmup_ms', 'first_request_ms']
+    print(('{:<12}' + ' {:>16}' * len(columns)).format('format', *columns))
+    for model_format, timings in report.items():
+        print(('{:<12}' + ' {:>16.1f}' * len(columns)).format(model_format, *[timings[column] for column in columns]))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model-dir', default='./../src')
+    parser.add_argument('--formats', nargs='+', default=['pickle', 'torchscript'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--warmup-batches', type=int, default=2)
+    args = parser.parse_args()
+
+    bench(os.path.abspath(args.model_dir), args.formats, args.repeat, args.warmup_batches)
@@ -0,0 +1,261 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Local stand-in for a SageMaker inference container.
+
+It serves the container contract(GET /ping, POST /invocations with Content-Type/Accept)
+around model_fn/input_fn/predict_fn/output_fn of inference.py. Like the model server in
+the container, a front-end accepts HTTP requests and hands them to worker processes,
+each of which calls model_fn once and then handles one request at a time.
+
+  python3 local_server.py --workers 4 --port 8080
+  curl -X POST -H 'Content-Type: application/json' -d '{"sentence": "..."}' localhost:8080/invocations
+"""
+
+import os
+import sys
+import json
+import argparse
+import importlib
+import threading
+import itertools
+import http.server
+import multiprocessing
+
+_content_type_json = 'application/json'
+_base_dir = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+_common_dir = os.path.join(_base_dir, '..', '..', 'codes', 'common', 'python')
+
+
+def _worker_main(worker_id, model_dir, code_dir, module_name, env, cpu_affinity, requests, responses):
+    os.environ.update(env)
+    if cpu_affinity is not None:
+        os.sched_setaffinity(0, cpu_affinity)
+    sys.path.insert(0, code_dir)
+    # modules shared with the Lambda functions, packed into code/ by script/pack_models.py
+    sys.path.append(_common_dir)
+    try:
+        module = importlib.import_module(module_name)
+        model = module.model_fn(model_dir)
+    except Exception as e:
+        responses.put((None, 'failed', '{}: {}'.format(worker_id, e)))
+        return
+    responses.put((None, 'ready', worker_id))
+
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+
+        request_id, body, content_type, accept = item
+        try:
+            input_data = module.input_fn(body, content_type)
+            prediction = module.predict_fn(input_data, model)
+            output, output_type = module.output_fn(prediction, accept)
+            responses.put((request_id, 'ok', (output, output_type)))
+        except Exception as e:
+            responses.put((request_id, 'error', str(e)))
+
+
+class _PendingRequest(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.status = None
+        self.result = None
+
+
+class _InvocationHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, so avoid the Nagle/delayed-ACK stall on keep-alive connections
+    disable_nagle_algorithm = True
+
+    def _respond(self, code, body, content_type=_content_type_json):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def do_GET(self):
+        if self.path != '/ping':
+            self._respond(404, json.dumps({'error': 'not found'}))
+        elif self.server.local_server.ready():
+            self._respond(200, '')
+        else:
+            self._respond(503, json.dumps({'error': 'workers are not ready'}))
+
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path != '/invocations':
+            self._respond(404, json.dumps({'error': 'not found'}))
+            return
+
+        content_type = self.headers.get('Content-Type', _content_type_json)
+        accept = self.headers.get('Accept')
+        if accept is None or accept == '*/*':
+            accept = _content_type_json
+
+        status, result = self.server.local_server.invoke(body, content_type, accept)
+        if status == 'ok':
+            output, output_type = result
+            self._respond(200, output, output_type)
+        else:
+            self._respond(500, json.dumps({'error': result}))
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer(object):
+
+    def __init__(self, model_dir, code_dir, workers, host='127.0.0.1', port=8080, module_name='inference', env=None, cpu_affinity=None,
+                 invoke_timeout=60):
+        self.model_dir = model_dir
+        self.code_dir = code_dir
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.module_name = module_name
+        self.env = env if env is not None else {}
+        # pins the workers to these CPUs(Linux only), to emulate a smaller instance type
+        self.cpu_affinity = cpu_affinity
+        # like the 60 sec limit of InvokeEndpoint, so a crashed worker does not hang the caller
+        self.invoke_timeout = invoke_timeout
+
+        context = multiprocessing.get_context('spawn')
+        self._requests = context.Queue()
+        self._responses = context.Queue()
+        self._processes = [context.Process(target=_worker_main, daemon=True,
+                                           args=(worker_id, model_dir, code_dir, module_name,
+                                                 dict(self.env, SAGEMAKER_MODEL_SERVER_WORKERS=str(workers)),
+                                                 cpu_affinity, self._requests, self._responses))
+                           for worker_id in range(workers)]
+
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._ready_workers = 0
+        self._ready_event = threading.Event()
+        self._failure = None
+        self._serve_thread = None
+
+        self._http_server = http.server.ThreadingHTTPServer((host, port), _InvocationHandler)
+        self._http_server.daemon_threads = True
+        self._http_server.local_server = self
+        self.port = self._http_server.server_address[1]
+
+
+    def ready(self):
+        return self._ready_event.is_set()
+
+
+    def _dispatch(self):
+        while True:
+            request_id, status, result = self._responses.get()
+            if status == 'stop':
+                break
+            if status == 'ready':
+                self._ready_workers += 1
+                if self._ready_workers == self.workers:
+                    self._ready_event.set()
+                continue
+            if status == 'failed':
+                self._failure = result
+                self._ready_event.set()
+                continue
+
+            with self._pending_lock:
+                pending = self._pending.pop(request_id, None)
+            if pending is None:
+                # the caller already timed out
+                continue
+            pending.status = status
+            pending.result = result
+            pending.event.set()
+
+
+    def invoke(self, body, content_type, accept):
+        pending = _PendingRequest()
+        with self._pending_lock:
+            request_id = next(self._request_ids)
+            self._pending[request_id] = pending
+
+        self._requests.put((request_id, bytes(body), content_type, accept))
+        if not pending.event.wait(self.invoke_timeout):
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            return 'error', 'no response from the workers in {} sec'.format(self.invoke_timeout)
+        return pending.status, pending.result
+
+
+    def start(self, timeout=300):
+        for process in self._processes:
+            process.start()
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+        if not self._ready_event.wait(timeout):
+            self.stop()
+            raise Exception('LocalServer: workers did not become ready in {} sec'.format(timeout))
+        if self._failure is not None:
+            self.stop()
+            raise Exception('LocalServer: model_fn failed in worker {}'.format(self._failure))
+
+        self._serve_thread = threading.Thread(target=self._http_server.serve_forever, daemon=True)
+        self._serve_thread.start()
+        return self
+
+
+    def stop(self):
+        # shutdown() waits for serve_forever(), which has not run if the workers failed to start
+        if self._serve_thread is not None:
+            self._http_server.shutdown()
+            self._serve_thread = None
+        self._http_server.server_close()
+        for _ in self._processes:
+            self._requests.put(None)
+        for process in self._processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        self._responses.put((None, 'stop', None))
+        # a crashed worker may have died holding a queue lock, which must not block the interpreter exit
+        self._requests.cancel_join_thread()
+        self._responses.cancel_join_thread()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model-dir', default=os.path.join(_base_dir, 'src'))
+    parser.add_argument('--code-dir', default=os.path.join(_base_dir, 'src', 'code'))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SAGEMAKER_MODEL_SERVER_WORKERS', multiprocessing.cpu_count())))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('SAGEMAKER_BIND_TO_PORT', '8080')))
+    args = parser.parse_args()
+
+    server = LocalServer(args.model_dir, args.code_dir, args.workers, args.host, args.port).start()
+    print('[INFO] serving {} workers on http://{}:{}'.format(args.workers, args.host, server.port))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
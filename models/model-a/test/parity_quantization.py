@@ -0,0 +1,126 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Accuracy and speed parity of the dynamic int8 quantized model(ENV_QUANTIZE) against fp32.
+
+It predicts input_data.json, plus an optional larger labeled set in JSON Lines
+({"sentence": "...", "label": 1} per line), with both models and reports label
+agreement, accuracy, latency speed-up and serialized model size.
+
+  python3 parity_quantization.py --mode all --labeled-set ag_news_test.jsonl --min-agreement 0.99
+"""
+
+import io
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/src/code')
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/../../codes/common/python')
+import inference as sm
+
+
+def load_samples(labeled_set):
+    with open('./input_data.json') as f:
+        samples = [(input['request']['sentence'], input['response']['label']) for input in json.load(f)]
+
+    if labeled_set is not None:
+        with open(labeled_set) as f:
+            for line in f:
+                if len(line.strip()) > 0:
+                    item = json.loads(line)
+                    samples.append((item['sentence'], item.get('label')))
+    return samples
+
+
+def predict_all(model, tensors, batch_size):
+    labels = []
+    with sm.torch.no_grad():
+        for start in range(0, len(tensors), batch_size):
+            labels.extend(sm._classify(tensors[start:start + batch_size], model))
+    return labels
+
+
+def time_all(model, tensors, batch_size, repeat):
+    durations = []
+    for _ in range(repeat):
+        before = time.perf_counter()
+        predict_all(model, tensors, batch_size)
+        durations.append(time.perf_counter() - before)
+    return statistics.median(durations)
+
+
+def serialized_size(model):
+    buffer = io.BytesIO()
+    sm.torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def accuracy(labels, samples):
+    labeled = [(label, expected) for label, (_, expected) in zip(labels, samples) if expected is not None]
+    return sum(1 for label, expected in labeled if label == expected) / len(labeled) if len(labeled) > 0 else None
+
+
+def check_parity(model_dict, samples, mode, batch_size, repeat):
+    fp32_model = model_dict['model']
+    int8_model = sm.quantize_model(copy.deepcopy(fp32_model), mode)
+
+    tensors = [sm._sentence_to_tensor(sentence, model_dict['dictionary']) for sentence, _ in samples]
+    fp32_labels = predict_all(fp32_model, tensors, batch_size)
+    int8_labels = predict_all(int8_model, tensors, batch_size)
+
+    fp32_time = time_all(fp32_model, tensors, batch_size, repeat)
+    int8_time = time_all(int8_model, tensors, batch_size, repeat)
+
+    return {
+        'mode': mode,
+        'samples': len(samples),
+        'agreement': sum(1 for a, b in zip(fp32_labels, int8_labels) if a == b) / len(samples),
+        'fp32_accuracy': accuracy(fp32_labels, samples),
+        'int8_accuracy': accuracy(int8_labels, samples),
+        'fp32_sec': fp32_time,
+        'int8_sec': int8_time,
+        'speedup': fp32_time / int8_time,
+        'fp32_bytes': serialized_size(fp32_model),
+        'int8_bytes': serialized_size(int8_model)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model-dir', default='./../src')
+    parser.add_argument('--mode', default='all', choices=['linear', 'all'])
+    parser.add_argument('--labeled-set', default=None)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-agreement', type=float, default=0.99)
+    args = parser.parse_args()
+
+    os.environ['ENV_QUANTIZE'] = 'none'
+    model_dict = sm.model_fn(args.model_dir)
+    report = check_parity(model_dict, load_samples(args.labeled_set), args.mode, args.batch_size, args.repeat)
+    print(json.dumps(report, indent=4))
+
+    if report['agreement'] < args.min_agreement:
+        print('[ERROR] label agreement {:.4f} is below {}'.format(report['agreement'], args.min_agreement))
+        sys.exit(1)
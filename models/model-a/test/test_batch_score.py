@@ -0,0 +1,136 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+import csv
+import sys
+import json
+import shutil
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/../../script')
+import batch_score
+
+_test_dir = os.path.dirname(os.path.abspath(__file__))
+_model_dir = os.path.join(os.path.dirname(_test_dir), 'src')
+
+
+def _load_inputs(repeat):
+    with open(os.path.join(_test_dir, 'input_data.json')) as f:
+        inputs = json.load(f)
+    return [{'id': '{}-{}'.format(index, input['type']), 'sentence': input['request']['sentence'],
+             'expected': input['response']['label']}
+            for index, input in enumerate(inputs * repeat)]
+
+
+def _read_output(output_path):
+    with open(output_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_batch_score_in_order_and_resume():
+    temp_dir = tempfile.mkdtemp()
+    records = _load_inputs(6)
+    input_path = os.path.join(temp_dir, 'input.jsonl')
+    with open(input_path, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+        f.write(json.dumps({'id': 'no-sentence'}) + '\n')
+        f.write('{"id": "malformed", "sentence": \n')
+
+    output_path = os.path.join(temp_dir, 'output.jsonl')
+    report = batch_score.batch_score(input_path, output_path, _model_dir, workers=2, chunk_size=5, max_inflight=2)
+    assert(report['records'] == len(records) + 2)
+    assert(report['completed'])
+
+    outputs = _read_output(output_path)
+    assert([output['id'] for output in outputs[:-2]] == [record['id'] for record in records])
+    assert(all(output['label'] == output['expected'] for output in outputs[:-2]))
+    # bad records get an error line each, the run goes on
+    assert('error' in outputs[-2])
+    assert(outputs[-1]['error'].startswith('invalid JSON line'))
+
+    with open(output_path, 'rb') as f:
+        full_output = f.read()
+
+    # interrupted after two chunks, with a partly written third chunk
+    partial_output = b''.join(full_output.splitlines(True)[:10])
+    with open(output_path, 'wb') as f:
+        f.write(partial_output + b'{"id": "partly wri')
+    batch_score.save_checkpoint(output_path, {'input': os.path.abspath(input_path), 'records_done': 10,
+                                              'output_bytes': len(partial_output), 'completed': False})
+
+    report = batch_score.batch_score(input_path, output_path, _model_dir, workers=2, chunk_size=5, resume=True)
+    assert(report['records'] == len(records) + 2 - 10)
+    with open(output_path, 'rb') as f:
+        assert(f.read() == full_output)
+
+    # a completed output is not scored again
+    report = batch_score.batch_score(input_path, output_path, _model_dir, workers=2, resume=True)
+    assert(report['records'] == 0)
+
+    # a checkpoint without its output is not resumed into a corrupted output
+    os.remove(output_path)
+    try:
+        batch_score.batch_score(input_path, output_path, _model_dir, workers=2, resume=True)
+        assert(False)
+    except Exception as e:
+        assert('missing or shorter' in str(e))
+
+    shutil.rmtree(temp_dir)
+
+
+def test_batch_score_model_fn_failure():
+    temp_dir = tempfile.mkdtemp()
+    input_path = os.path.join(temp_dir, 'input.jsonl')
+    with open(input_path, 'w') as f:
+        f.write(json.dumps({'sentence': 'Stock investing has higher returns in the long run.'}) + '\n')
+
+    # fails on the first chunk instead of respawning the pool workers forever
+    try:
+        batch_score.batch_score(input_path, os.path.join(temp_dir, 'output.jsonl'), temp_dir, workers=1)
+        assert(False)
+    except Exception as e:
+        assert('model_fn failed' in str(e))
+
+    shutil.rmtree(temp_dir)
+
+
+def test_batch_score_csv():
+    temp_dir = tempfile.mkdtemp()
+    records = _load_inputs(1)
+    input_path = os.path.join(temp_dir, 'input.csv')
+    with open(input_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['id', 'sentence', 'expected'])
+        writer.writeheader()
+        writer.writerows(records)
+
+    output_path = os.path.join(temp_dir, 'output.jsonl')
+    batch_score.batch_score(input_path, output_path, _model_dir, workers=1, chunk_size=2)
+
+    outputs = _read_output(output_path)
+    assert([output['id'] for output in outputs] == [record['id'] for record in records])
+    assert(all(output['label'] == int(output['expected']) for output in outputs))
+
+    shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    test_batch_score_in_order_and_resume()
+    test_batch_score_model_fn_failure()
+    test_batch_score_csv()
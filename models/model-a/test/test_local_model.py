@@ -19,9 +19,12 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 import os
 import sys
 import json
+import tempfile
 
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/src/code')
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/../../codes/common/python')
 import inference as sm
+import phase_timer
 
 def test_simulation():
     # Prepare model
@@ -49,5 +52,142 @@ def test_simulation():
         print('[{}]: completed==>{}'.format(input['type'], input['request']['sentence']))
 
 
+def test_batch_simulation():
+    # Prepare model
+    model_path = './../src'
+    model_dict = sm.model_fn(model_path)
+
+    with open('./input_data.json') as f:
+        inputs = json.load(f)
+
+    # PreProcessing input: every sentence in one request
+    request_str = json.dumps({'sentences': [input['request']['sentence'] for input in inputs]})
+    sentences = sm.input_fn(request_str, 'application/json')
+
+    # Predict input
+    prediction_output = sm.predict_fn(sentences, model_dict)
+
+    # PostProcessing output
+    response_str, _ = sm.output_fn(prediction_output, 'application/json')
+
+    # validate result
+    print('[batch]: result==>{}'.format(response_str))
+    response = json.loads(response_str)
+    assert(response['success'] == 'true')
+    assert(response['labels'] == [input['response']['label'] for input in inputs])
+
+
+def test_multi_model_simulation():
+    # Prepare two model artifacts in one container, both copies of ./../src
+    model_path = tempfile.mkdtemp()
+    for name in ['model-a', 'model-b']:
+        os.makedirs(os.path.join(model_path, 'models', name))
+        for file_name in os.listdir('./../src'):
+            if os.path.isfile(os.path.join('./../src', file_name)):
+                os.symlink(os.path.abspath(os.path.join('./../src', file_name)), os.path.join(model_path, 'models', name, file_name))
+    model_dict = sm.model_fn(model_path)
+
+    with open('./input_data.json') as f:
+        inputs = json.load(f)
+    for input in inputs:
+        for name in ['model-a', 'model-b']:
+            request = dict(input['request'], target_model=name)
+            prediction_output = sm.predict_fn(sm.input_fn(json.dumps(request), 'application/json'), model_dict)
+            response_str, _ = sm.output_fn(prediction_output, 'application/json')
+            assert(input['response']['label'] == json.loads(response_str)['label'])
+
+    assert(sm.get_registry_stats(model_dict)['loaded'] == ['model-a', 'model-b'])
+    # each hosted model keeps its own load/warm-up timings
+    assert(set(['model-a', 'model-b']) <= set(sm.get_startup_timings()['models'].keys()))
+
+    # JSON Lines: target_model per line, an unknown model fails only its own line
+    lines = [json.dumps(dict(inputs[0]['request'], target_model=name)) for name in ['model-b', 'model-c', 'model-a']]
+    input_data = sm.input_fn('\n'.join(lines), 'application/jsonlines')
+    response_str, _ = sm.output_fn(sm.predict_fn(input_data, model_dict), 'application/jsonlines')
+    responses = [json.loads(line) for line in response_str.splitlines()]
+    assert([response['success'] for response in responses] == ['true', 'false', 'true'])
+    assert(responses[0]['label'] == responses[2]['label'] == inputs[0]['response']['label'])
+
+
+def test_empty_multi_model():
+    model_path = tempfile.mkdtemp()
+    os.makedirs(os.path.join(model_path, 'models'))
+    try:
+        sm.model_fn(model_path)
+        assert(False)
+    except Exception as e:
+        assert('no model directory' in str(e))
+
+
+def test_jsonlines_simulation():
+    # Prepare model
+    model_path = './../src'
+    model_dict = sm.model_fn(model_path)
+
+    with open('./input_data.json') as f:
+        inputs = json.load(f)
+
+    # PreProcessing input: one request per line, with an invalid line in the middle
+    lines = [json.dumps(input['request']) for input in inputs]
+    lines.insert(2, '{"text": "no sentence"}')
+    request_bytes = '\n'.join(lines).encode('utf-8')
+    input_data = sm.input_fn(request_bytes, 'application/jsonlines')
+
+    # Predict input
+    prediction_output = sm.predict_fn(input_data, model_dict)
+
+    # PostProcessing output
+    response_str, content_type = sm.output_fn(prediction_output, 'application/jsonlines')
+
+    # validate result
+    assert(content_type == 'application/jsonlines')
+    responses = [json.loads(line) for line in response_str.splitlines()]
+    assert(len(responses) == len(inputs) + 1)
+    assert(responses[2]['success'] == 'false')
+    del responses[2]
+    for input, response in zip(inputs, responses):
+        assert(input['response']['label'] == response['label'])
+
+    # without Accept the toolkit passes application/json, which still gets JSON Lines
+    for accept in ['application/json', '*/*']:
+        prediction_output = sm.predict_fn(sm.input_fn(request_bytes, 'application/jsonlines'), model_dict)
+        assert(sm.output_fn(prediction_output, accept) == (response_str, 'application/jsonlines'))
+    try:
+        sm.output_fn(sm.predict_fn(sm.input_fn(request_bytes, 'application/jsonlines'), model_dict), 'text/csv')
+        assert(False)
+    except Exception as e:
+        assert('Accept' in str(e))
+
+
+def test_timing_simulation():
+    # Prepare model
+    model_path = './../src'
+    model_dict = sm.model_fn(model_path)
+
+    collector = phase_timer.InMemoryCollector(sample_rate=1.0)
+    sm.set_timing_collector(collector)
+    sm._return_timings = True
+    try:
+        sentence = sm.input_fn(json.dumps({'sentence': 'Stock investing has higher returns in the long run.'}), 'application/json')
+        response_str, _ = sm.output_fn(sm.predict_fn(sentence, model_dict), 'application/json')
+    finally:
+        sm._return_timings = False
+        sm.set_timing_collector(phase_timer.InMemoryCollector(sample_rate=0.0))
+
+    # validate result: the response carries the phases before output_fn, the EMF record all of them
+    print('[timings]: result==>{}'.format(response_str))
+    response = json.loads(response_str)
+    assert(response['success'] == 'true')
+    assert(set(['input_fn', 'preprocess', 'predict_fn']) <= set(response['timings'].keys()))
+    assert(len(collector.records) == 1)
+    assert('output_fn' in collector.records[0])
+    assert(collector.records[0]['predict_fn'] >= collector.records[0]['preprocess'])
+
+
 if __name__ == '__main__':
     test_simulation()
+    test_batch_simulation()
+    test_multi_model_simulation()
+    test_empty_multi_model()
+    test_jsonlines_simulation()
+    test_timing_simulation()
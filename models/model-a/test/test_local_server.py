@@ -0,0 +1,73 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+import json
+import http.client
+
+import local_server
+
+_base_dir = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+
+
+def _request(server, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection(server.host, server.port)
+    conn.request(method, path, body, headers if headers is not None else {})
+    response = conn.getresponse()
+    return response.status, response.getheader('Content-Type'), response.read().decode('utf-8')
+
+
+def test_local_server():
+    server = local_server.LocalServer(os.path.join(_base_dir, 'src'), os.path.join(_base_dir, 'src', 'code'), workers=2, port=0).start()
+    try:
+        status, _, _ = _request(server, 'GET', '/ping')
+        assert(status == 200)
+
+        with open('./input_data.json') as f:
+            inputs = json.load(f)
+        for input in inputs:
+            status, content_type, body = _request(server, 'POST', '/invocations', json.dumps(input['request']),
+                                                  {'Content-Type': 'application/json', 'Accept': '*/*'})
+            assert(status == 200)
+            assert(content_type == 'application/json')
+            assert(json.loads(body)['label'] == input['response']['label'])
+
+        status, _, _ = _request(server, 'POST', '/invocations', 'sentence', {'Content-Type': 'text/csv'})
+        assert(status == 500)
+    finally:
+        server.stop()
+
+
+def test_crashed_worker():
+    server = local_server.LocalServer(os.path.join(_base_dir, 'src'), os.path.join(_base_dir, 'src', 'code'), workers=1, port=0,
+                                      invoke_timeout=2).start()
+    try:
+        server._processes[0].kill()
+        server._processes[0].join()
+        # the request times out with 500 instead of hanging
+        status, _, body = _request(server, 'POST', '/invocations', json.dumps({'sentence': 'no worker'}),
+                                   {'Content-Type': 'application/json'})
+        assert(status == 500)
+        assert('no response' in json.loads(body)['error'])
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    test_local_server()
+    test_crashed_worker()
@@ -0,0 +1,80 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/src/code')
+import model_registry
+
+
+def _create_registry(names, memory_budget_bytes):
+    root_dir = tempfile.mkdtemp()
+    for name in names:
+        os.mkdir(os.path.join(root_dir, name))
+
+    loaded = []
+    def loader(model_dir, name):
+        loaded.append(name)
+        return {'name': name, 'path': model_dir}
+
+    registry = model_registry.ModelRegistry(root_dir, memory_budget_bytes, loader, sizeof=lambda model_dict: 10)
+    return registry, loaded
+
+
+def test_lazy_load_and_share():
+    registry, loaded = _create_registry(['model-a', 'model-b'], 100)
+    assert(loaded == [])
+
+    first = registry.get('model-a')
+    second = registry.get('model-a')
+    assert(first is second)
+    assert(loaded == ['model-a'])
+
+
+def test_lru_eviction_within_budget():
+    registry, loaded = _create_registry(['model-a', 'model-b', 'model-c'], 20)
+    registry.get('model-a')
+    registry.get('model-b')
+    registry.get('model-a')
+    # model-b is the least recently used model
+    registry.get('model-c')
+
+    stats = registry.stats()
+    assert(stats['loaded'] == ['model-a', 'model-c'])
+    assert(stats['bytes'] == 20)
+    assert(stats['evictions'] == 1)
+
+    registry.get('model-b')
+    assert(loaded == ['model-a', 'model-b', 'model-c', 'model-b'])
+
+
+def test_unknown_model():
+    registry, _ = _create_registry(['model-a'], 20)
+    try:
+        registry.get('model-x')
+        assert(False)
+    except Exception as e:
+        assert('model-x' in str(e))
+
+
+if __name__ == '__main__':
+    test_lazy_load_and_share()
+    test_lru_eviction_within_budget()
+    test_unknown_model()
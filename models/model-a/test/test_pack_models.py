@@ -0,0 +1,107 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+import sys
+import gzip
+import shutil
+import tarfile
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/../../script')
+import pack_models
+
+
+def _make_model_root(root, name):
+    model_src = os.path.join(root, name, 'src')
+    os.makedirs(os.path.join(model_src, 'code', '__pycache__'))
+    with open(os.path.join(model_src, 'model.pth'), 'wb') as f:
+        f.write(os.urandom(4096))
+    with open(os.path.join(model_src, 'code', 'inference.py'), 'w') as f:
+        f.write('def model_fn(model_dir):\n    return None\n')
+    with open(os.path.join(model_src, 'code', '__pycache__', 'inference.pyc'), 'wb') as f:
+        f.write(b'ignored')
+    return os.path.join(root, name, 'model')
+
+
+def test_archive_is_deterministic():
+    root = tempfile.mkdtemp()
+    model_dir = _make_model_root(root, 'model-a')
+    model_src = os.path.join(root, 'model-a', 'src')
+
+    for compression in ['gzip', 'gzip-fast', 'none']:
+        first = pack_models.pack_model(model_dir, model_src, compression, force=True)
+        with open(first['archive_path'], 'rb') as f:
+            first_bytes = f.read()
+        os.utime(os.path.join(model_src, 'model.pth'), (1, 1))
+        second = pack_models.pack_model(model_dir, model_src, compression, force=True)
+        with open(second['archive_path'], 'rb') as f:
+            assert(f.read() == first_bytes)
+
+        with gzip.open(second['archive_path']) as f:
+            with tarfile.open(fileobj=f) as tar:
+                names = tar.getnames()
+        assert('model.pth' in names and 'code/inference.py' in names)
+        # shared modules are packed into code/, caches are not
+        assert('code/phase_timer.py' in names)
+        assert(not any('__pycache__' in name for name in names))
+
+    shutil.rmtree(root)
+
+
+def test_skip_unchanged_and_dedupe_uploads():
+    root = tempfile.mkdtemp()
+    model_dir = _make_model_root(root, 'model-a')
+    store = pack_models.LocalStore(os.path.join(root, 'bucket'))
+    model_list = [
+        {'ModelLocalPath': model_dir, 'ModelS3Key': 'models/model-a/model'},
+        {'ModelLocalPath': model_dir, 'ModelS3Key': 'models/model-b/model'}
+    ]
+
+    report = pack_models.pack_models(model_list, store=store)
+    assert(report['Rebuilt'] == 1)
+    assert([upload['action'] for upload in report['Uploads']] == ['uploaded', 'copied'])
+    assert(store.uploads == 1 and store.copies == 1)
+    sha256 = report['Models'][0]['archive_sha256']
+    assert(store.get_sha256('models/model-b/model/model.tar.gz') == sha256)
+
+    # unchanged inputs are neither rebuilt nor uploaded
+    report = pack_models.pack_models(model_list, store=store)
+    assert(report['Rebuilt'] == 0)
+    assert([upload['action'] for upload in report['Uploads']] == ['skipped', 'skipped'])
+    assert(report['UploadedBytes'] == 0 and store.uploads == 1)
+
+    # a changed input rebuilds the archive and uploads it once again
+    with open(os.path.join(root, 'model-a', 'src', 'code', 'inference.py'), 'a') as f:
+        f.write('# changed\n')
+    report = pack_models.pack_models(model_list, store=store)
+    assert(report['Rebuilt'] == 1)
+    assert(report['Models'][0]['archive_sha256'] != sha256)
+    assert([upload['action'] for upload in report['Uploads']] == ['uploaded', 'copied'])
+
+    # so does another compression
+    report = pack_models.pack_models(model_list, compression='none', store=store)
+    assert(report['Rebuilt'] == 1)
+    assert(store.uploads == 3)
+
+    shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    test_archive_is_deterministic()
+    test_skip_unchanged_and_dedupe_uploads()
@@ -0,0 +1,67 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/src/code')
+import sentence_cache
+
+
+def test_lru_eviction_by_entries():
+    cache = sentence_cache.LRUCache(max_entries=2, max_bytes=1024 * 1024)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert(cache.get('a') == 1)
+
+    # "b" is the least recently used entry now
+    cache.put('c', 3)
+    assert(cache.get('b') is None)
+    assert(cache.get('a') == 1)
+    assert(cache.get('c') == 3)
+
+    stats = cache.stats()
+    assert(stats['hits'] == 3)
+    assert(stats['misses'] == 1)
+    assert(stats['evictions'] == 1)
+    assert(stats['entries'] == 2)
+
+
+def test_lru_eviction_by_bytes():
+    cache = sentence_cache.LRUCache(max_entries=100, max_bytes=10, sizeof=lambda item: 1)
+    for index in range(5):
+        cache.put(str(index), index)
+    assert(cache.stats()['bytes'] == 10)
+
+    cache.put('5', 5)
+    assert(cache.get('0') is None)
+    assert(cache.get('5') == 5)
+    assert(cache.stats()['evictions'] == 1)
+
+
+def test_disabled_cache():
+    cache = sentence_cache.LRUCache(max_entries=0, max_bytes=1024)
+    cache.put('a', 1)
+    assert(not cache.enabled())
+    assert(cache.get('a') is None)
+
+
+if __name__ == '__main__':
+    test_lru_eviction_by_entries()
+    test_lru_eviction_by_bytes()
+    test_disabled_cache()
@@ -0,0 +1,65 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))+'/src/code')
+import vocab_index
+
+
+class DefaultVocab(dict):
+    def __getitem__(self, token):
+        return self.get(token, 0)
+
+
+def _build(vocab):
+    index_path = os.path.join(tempfile.mkdtemp(), 'vocab.idx')
+    stoi, unk_id = vocab_index.get_stoi(vocab)
+    vocab_index.write_index(stoi, unk_id, index_path)
+    return vocab_index.MmapVocab(index_path)
+
+
+def test_lookup_matches_vocab():
+    vocab = DefaultVocab({'<unk>': 0, 'the': 1, 'new': 2, 'the new': 3, 'président': 4, '.': 5})
+    index = _build(vocab)
+
+    assert(len(index) == len(vocab))
+    for token in vocab.keys():
+        assert(index[token] == vocab[token])
+        assert(token in index)
+
+    # unknown tokens map to the same id as the original vocab
+    assert(index['baseball'] == vocab['baseball'])
+    assert('baseball' not in index)
+
+
+def test_lookup_without_unknown_token():
+    index = _build({'the': 0, 'new': 1})
+    assert(index['new'] == 1)
+    try:
+        index['baseball']
+        assert(False)
+    except KeyError:
+        pass
+
+
+if __name__ == '__main__':
+    test_lookup_matches_vocab()
+    test_lookup_without_unknown_token()
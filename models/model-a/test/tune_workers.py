@@ -0,0 +1,148 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Sweeps ModelServerWorkers x intra-op threads per worker(ENV_THREADS_PER_WORKER) against the
+local serving path(local_server.py), and recommends the throughput-maximizing combination
+for a given vCPU count. The model server workers are pinned to --vcpus CPUs, so a larger
+machine can emulate a smaller instance type(e.g. 2 for ml.c5.large, 4 for ml.c5.xlarge).
+
+  python3 tune_workers.py --vcpus 4 --duration 20
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+import http.client
+
+import local_server
+
+_base_dir = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+
+
+def generate_load(port, body, clients, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        local_latencies = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            before = time.perf_counter()
+            conn.request('POST', '/invocations', body, {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            local_latencies.append((time.perf_counter() - before) * 1000)
+            if response.status != 200:
+                local_errors += 1
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'throughput': len(latencies) / duration,
+        'p50_ms': latencies[len(latencies) // 2] if len(latencies) > 0 else None,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] if len(latencies) > 0 else None,
+        'errors': errors[0]
+    }
+
+
+def candidates(vcpus, max_oversubscription):
+    for workers in range(1, vcpus * max_oversubscription + 1):
+        for threads in range(1, vcpus + 1):
+            if workers * threads <= vcpus * max_oversubscription:
+                yield workers, threads
+
+
+def tune(model_dir, code_dir, vcpus, body, duration, max_oversubscription, clients_per_worker, tolerance):
+    cpu_affinity = sorted(os.sched_getaffinity(0))[:vcpus]
+    if len(cpu_affinity) < vcpus:
+        raise Exception('tune: this machine has only {} CPUs'.format(len(cpu_affinity)))
+
+    results = []
+    for workers, threads in candidates(vcpus, max_oversubscription):
+        server = local_server.LocalServer(model_dir, code_dir, workers, port=0,
+                                          env={'ENV_THREADS_PER_WORKER': str(threads)},
+                                          cpu_affinity=cpu_affinity).start()
+        try:
+            # short warm-up, then the measured run
+            generate_load(server.port, body, workers * clients_per_worker, min(2.0, duration))
+            result = generate_load(server.port, body, workers * clients_per_worker, duration)
+        finally:
+            server.stop()
+
+        result.update({'workers': workers, 'threads_per_worker': threads})
+        results.append(result)
+        print('[INFO] workers {:>2} x threads {:>2}: {:>8.1f} req/s, p50 {:>7.2f} ms, p99 {:>7.2f} ms, errors {}'.format(
+            workers, threads, result['throughput'], result['p50_ms'], result['p99_ms'], result['errors']))
+
+    # within the measurement noise, prefer fewer processes(less memory) and then a lower p99
+    healthy = [result for result in results if result['errors'] == 0]
+    if len(healthy) == 0:
+        raise Exception('tune: every combination returned errors')
+    top = max(result['throughput'] for result in healthy)
+    best = min((result for result in healthy if result['throughput'] >= top * (1 - tolerance)),
+               key=lambda result: (result['workers'], result['p99_ms']))
+    return {
+        'vcpus': vcpus,
+        'results': results,
+        'recommendation': {
+            'ModelServerWorkers': str(best['workers']),
+            'ENV_THREADS_PER_WORKER': str(best['threads_per_worker']),
+            'throughput': best['throughput']
+        }
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model-dir', default=os.path.join(_base_dir, 'src'))
+    parser.add_argument('--code-dir', default=os.path.join(_base_dir, 'src', 'code'))
+    parser.add_argument('--vcpus', type=int, default=len(os.sched_getaffinity(0)))
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--max-oversubscription', type=int, default=2, help='workers x threads <= vcpus x this')
+    parser.add_argument('--clients-per-worker', type=int, default=2)
+    parser.add_argument('--tolerance', type=float, default=0.05, help='throughput within this ratio of the best is a tie')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    sentence = 'Stock investing has higher returns in the long run.'
+    if args.batch_size == 1:
+        body = json.dumps({'sentence': sentence})
+    else:
+        body = json.dumps({'sentences': [sentence] * args.batch_size})
+
+    report = tune(args.model_dir, args.code_dir, args.vcpus, body, args.duration, args.max_oversubscription, args.clients_per_worker, args.tolerance)
+    print(json.dumps(report['recommendation'], indent=4))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
@@ -0,0 +1,270 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Offline batch scoring with inference.py, a local stand-in for a batch transform job.
+
+It streams a JSON Lines({"sentence": "..."} per line) or CSV(with a header) input, fans
+chunks out to a pool of processes which call model_fn once each, and writes one JSON line
+per input record({...record, "label": 2}) in input order. Only max_inflight chunks are in
+memory at a time. A checkpoint next to the output records how many records and bytes were
+written, so --resume continues an interrupted run.
+
+  python3 script/batch_score.py --input sentences.jsonl --output labels.jsonl --model-dir models/model-a/src
+  python3 script/batch_score.py --input sentences.csv --output labels.jsonl --workers 4 --resume
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import collections
+import multiprocessing
+
+
+CHECKPOINT_SUFFIX = '.checkpoint'
+
+_repo_dir = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+COMMON_DIR = os.path.join(_repo_dir, 'codes', 'common', 'python')
+
+# set in each pool process by _init_worker
+_inference = None
+_model_dict = None
+_init_error = None
+
+
+def resolve_input_format(input_path, input_format='auto'):
+    if input_format != 'auto':
+        return input_format
+    return 'csv' if input_path.lower().endswith('.csv') else 'jsonl'
+
+
+class InvalidRecord(object):
+    """A JSON Lines input line which did not parse, scored as an error line instead of aborting the run."""
+
+    def __init__(self, line, error):
+        self.line = line
+        self.error = error
+
+
+def iter_records(input_path, input_format='jsonl'):
+    """Yield one dict per input record, streaming from input_path."""
+    with open(input_path, 'r', newline='' if input_format == 'csv' else None, encoding='utf-8') as f:
+        if input_format == 'csv':
+            for row in csv.DictReader(f):
+                yield row
+            return
+
+        if input_format != 'jsonl':
+            raise Exception('batch_score: unsupported input format: ' + input_format)
+        for line in f:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield InvalidRecord(line, 'invalid JSON line: {}'.format(e))
+
+
+def iter_chunks(records, chunk_size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def _init_worker(model_dir, workers):
+    global _inference, _model_dict, _init_error
+
+    # inference.py splits the CPUs between SAGEMAKER_MODEL_SERVER_WORKERS processes
+    os.environ['SAGEMAKER_MODEL_SERVER_WORKERS'] = str(workers)
+    sys.path.append(os.path.join(model_dir, 'code'))
+    sys.path.append(COMMON_DIR)
+    try:
+        import inference
+        _inference = inference
+        _model_dict = inference.model_fn(model_dir)
+    except Exception as e:
+        # raising here makes Pool respawn the worker forever, so fail the first chunk instead
+        _init_error = '{}: {}'.format(type(e).__name__, e)
+
+
+def score_chunk(records, text_field='sentence'):
+    """Return the output JSON lines of records as one string, records without text get 'error'."""
+    if _init_error is not None:
+        raise Exception('batch_score: model_fn failed in worker {}: {}'.format(os.getpid(), _init_error))
+
+    sentences = []
+    indexes = []
+    results = []
+    for index, record in enumerate(records):
+        if isinstance(record, InvalidRecord):
+            results.append({'line': record.line, 'error': record.error})
+            continue
+        result = dict(record) if isinstance(record, dict) else {'record': record}
+        sentence = result.get(text_field) if isinstance(record, dict) else None
+        if not isinstance(sentence, str):
+            result['error'] = 'record did not contain {} as string'.format(text_field)
+        else:
+            sentences.append(sentence)
+            indexes.append(index)
+        results.append(result)
+
+    if len(sentences) > 0:
+        labels = _inference.predict_fn(sentences, _model_dict)
+        for index, label in zip(indexes, labels):
+            results[index]['label'] = label
+
+    return ''.join(json.dumps(result) + '\n' for result in results)
+
+
+def checkpoint_path(output_path):
+    return output_path + CHECKPOINT_SUFFIX
+
+
+def load_checkpoint(output_path):
+    path = checkpoint_path(output_path)
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_checkpoint(output_path, checkpoint):
+    path = checkpoint_path(output_path)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(path + '.tmp', path)
+
+
+def batch_score(input_path, output_path, model_dir, input_format='auto', text_field='sentence',
+                workers=None, chunk_size=256, max_inflight=None, resume=False, report_interval_in_sec=10):
+    input_format = resolve_input_format(input_path, input_format)
+    workers = workers if workers is not None else max(1, multiprocessing.cpu_count() // 2)
+    max_inflight = max_inflight if max_inflight is not None else workers * 2
+
+    records_done = 0
+    output_bytes = 0
+    checkpoint = load_checkpoint(output_path) if resume else None
+    if checkpoint is not None:
+        if checkpoint['input'] != os.path.abspath(input_path):
+            raise Exception('batch_score: checkpoint was written for another input: ' + checkpoint['input'])
+        records_done = checkpoint['records_done']
+        output_bytes = checkpoint['output_bytes']
+        if not os.path.isfile(output_path) or os.path.getsize(output_path) < output_bytes:
+            raise Exception('batch_score: {} is missing or shorter than its checkpoint({} bytes), '
+                            'remove {} to start over'.format(output_path, output_bytes, checkpoint_path(output_path)))
+        if checkpoint.get('completed'):
+            print('[INFO] {} is already completed'.format(output_path))
+            return dict(checkpoint, records=0, elapsed_in_sec=0.0, records_per_sec=0.0)
+
+    # drop anything written after the last checkpoint, it is scored again
+    output = open(output_path, 'r+b' if checkpoint is not None else 'wb')
+    output.truncate(output_bytes)
+    output.seek(output_bytes)
+
+    checkpoint = {
+        'input': os.path.abspath(input_path),
+        'records_done': records_done,
+        'output_bytes': output_bytes,
+        'completed': False
+    }
+    save_checkpoint(output_path, checkpoint)
+
+    records = iter_records(input_path, input_format)
+    for _ in range(records_done):
+        next(records, None)
+
+    start = time.time()
+    last_report = start
+    scored = 0
+
+    def write_result(result):
+        nonlocal scored, last_report
+        count, lines = result.get()
+        data = lines.encode('utf-8')
+        output.write(data)
+        output.flush()
+        checkpoint['records_done'] += count
+        checkpoint['output_bytes'] += len(data)
+        save_checkpoint(output_path, checkpoint)
+        scored += count
+
+        now = time.time()
+        if now - last_report >= report_interval_in_sec:
+            last_report = now
+            print('[INFO] scored {} records, {:.1f} records/sec'.format(scored, scored / (now - start)))
+
+    context = multiprocessing.get_context('spawn')
+    pool = context.Pool(workers, initializer=_init_worker, initargs=(os.path.abspath(model_dir), workers))
+    try:
+        inflight = collections.deque()
+        for chunk in iter_chunks(records, chunk_size):
+            if len(inflight) >= max_inflight:
+                write_result(inflight.popleft())
+            inflight.append(_CountedResult(len(chunk), pool.apply_async(score_chunk, (chunk, text_field))))
+        while len(inflight) > 0:
+            write_result(inflight.popleft())
+    finally:
+        pool.terminate()
+        pool.join()
+        output.close()
+
+    checkpoint['completed'] = True
+    save_checkpoint(output_path, checkpoint)
+
+    elapsed = time.time() - start
+    report = dict(checkpoint, records=scored, elapsed_in_sec=elapsed,
+                  records_per_sec=scored / elapsed if elapsed > 0 else 0.0)
+    print('[INFO] scored {} records in {:.1f}sec, {:.1f} records/sec, {} workers'.format(
+        scored, elapsed, report['records_per_sec'], workers))
+    return report
+
+
+class _CountedResult(object):
+    def __init__(self, count, async_result):
+        self.count = count
+        self.async_result = async_result
+
+    def get(self):
+        return self.count, self.async_result.get()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', required=True)
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--model-dir', default='models/model-a/src')
+    parser.add_argument('--input-format', default='auto', choices=['auto', 'jsonl', 'csv'])
+    parser.add_argument('--text-field', default='sentence')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=256)
+    parser.add_argument('--max-inflight', type=int, default=None, help='chunks in memory, default 2 per worker')
+    parser.add_argument('--resume', action='store_true')
+    parser.add_argument('--report-interval', type=float, default=10)
+    args = parser.parse_args()
+
+    batch_score(args.input, args.output, args.model_dir, args.input_format, args.text_field, args.workers,
+                args.chunk_size, args.max_inflight, args.resume, args.report_interval)
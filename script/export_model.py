@@ -0,0 +1,66 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Export the pickled model(model.pth) into faster-loading artifacts for ENV_MODEL_FORMAT.
+
+  python3 script/export_model.py --model-src models/model-a/src --format torchscript
+  python3 script/export_model.py --model-src models/model-a/src --format torchscript --quantize all
+"""
+
+import os
+import sys
+import argparse
+
+import torch
+
+
+def export_model(model_src, model_format, quantize='none'):
+    sys.path.append(os.path.join(model_src, 'code'))
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(os.path.dirname(__file__))), 'codes', 'common', 'python'))
+
+    model = torch.load(os.path.join(model_src, 'model.pth'), map_location='cpu')
+    model.eval()
+
+    if quantize != 'none':
+        if model_format != 'torchscript':
+            raise Exception('export_model: quantized models can be exported only as torchscript')
+        import inference
+        model = inference.quantize_model(model, quantize)
+
+    if model_format == 'torchscript':
+        output_path = os.path.join(model_src, 'model.pt')
+        torch.jit.save(torch.jit.script(model), output_path)
+    elif model_format == 'state_dict':
+        output_path = os.path.join(model_src, 'model_state.pth')
+        torch.save(model.state_dict(), output_path)
+    else:
+        raise Exception('export_model: unsupported format: ' + model_format)
+
+    print('[INFO] exported {} model(quantize: {}) into {}'.format(model_format, quantize, output_path))
+    return output_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model-src', default='models/model-a/src')
+    parser.add_argument('--format', default='torchscript', choices=['torchscript', 'state_dict'])
+    parser.add_argument('--quantize', default='none', choices=['none', 'linear', 'all'])
+    args = parser.parse_args()
+
+    export_model(args.model_src, args.format, args.quantize)
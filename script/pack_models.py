@@ -0,0 +1,372 @@
+"""
+Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+SPDX-License-Identifier: MIT-0
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+"""
+Pack model.tar.gz for every ModelLocalPath in ModelArchiving.ModelList, content-addressed.
+
+The archive is built deterministically(sorted entries, fixed mtime/owner/mode), so the
+same inputs always produce the same bytes. The sha256 of the inputs is kept in a
+manifest next to the model directory, and an unchanged model is neither rebuilt nor
+uploaded again. With --bucket(or --local-store), each ModelS3Key is uploaded once per
+distinct archive, and keys sharing the same archive are copied server-side.
+
+  python3 script/pack_models.py
+  python3 script/pack_models.py --vocab-index --export-format torchscript --quantize all
+  python3 script/pack_models.py --compression none --bucket [model-archiving-bucket]
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import tarfile
+import hashlib
+import argparse
+import subprocess
+
+
+MODEL_FILE = 'model.tar.gz'
+MANIFEST_SUFFIX = '.manifest.json'
+SHA256_METADATA = 'sha256'
+
+# gzip level per compression mode, 'none' still writes a valid gzip stream(stored blocks),
+# because SageMaker expects model.tar.gz, and it is the fastest to decompress at container start
+COMPRESSION_LEVELS = {
+    'gzip': 6,
+    'gzip-fast': 1,
+    'none': 0
+}
+
+EXCLUDED_NAMES = set([MODEL_FILE, '__pycache__', '.DS_Store'])
+EXCLUDED_SUFFIXES = ('.pyc',)
+CHUNK_SIZE = 1024 * 1024
+
+_repo_dir = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+COMMON_DIR = os.path.join(_repo_dir, 'codes', 'common', 'python')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def collect_inputs(model_src, common_dir=COMMON_DIR):
+    """Return sorted (arcname, path) pairs: model_src, plus the shared modules as code/*.py."""
+    entries = {}
+    for root, dirs, files in os.walk(model_src):
+        dirs[:] = sorted(name for name in dirs if name not in EXCLUDED_NAMES)
+        for name in files:
+            if name in EXCLUDED_NAMES or name.endswith(EXCLUDED_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            entries[os.path.relpath(path, model_src).replace(os.sep, '/')] = path
+
+    # modules shared with the Lambda functions
+    if common_dir is not None and os.path.isdir(common_dir):
+        for name in sorted(os.listdir(common_dir)):
+            if name.endswith('.py'):
+                entries['code/' + name] = os.path.join(common_dir, name)
+
+    return sorted(entries.items())
+
+
+def compute_input_hash(inputs, compression):
+    digest = hashlib.sha256()
+    digest.update('compression={}\n'.format(compression).encode('utf-8'))
+    for arcname, path in inputs:
+        digest.update('{} {}\n'.format(arcname, file_sha256(path)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _tar_info(tar, path, arcname):
+    info = tar.gettarinfo(path, arcname)
+    info.mtime = 0
+    info.uid = info.gid = 0
+    info.uname = info.gname = ''
+    info.mode = 0o755 if info.isdir() or info.mode & 0o111 else 0o644
+    return info
+
+
+def build_archive(inputs, output_path, compression='gzip'):
+    """Write a reproducible tar.gz of inputs: the bytes depend only on names, contents and compression."""
+    if compression not in COMPRESSION_LEVELS:
+        raise Exception('pack_models: unsupported compression: ' + compression)
+
+    directories = set()
+    for arcname, _ in inputs:
+        parts = arcname.split('/')[:-1]
+        for i in range(len(parts)):
+            directories.add('/'.join(parts[:i + 1]))
+
+    temp_path = output_path + '.tmp'
+    with open(temp_path, 'wb') as raw:
+        with gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0,
+                           compresslevel=COMPRESSION_LEVELS[compression]) as compressed:
+            with tarfile.open(fileobj=compressed, mode='w', format=tarfile.PAX_FORMAT) as tar:
+                members = [(name, None) for name in directories] + list(inputs)
+                for arcname, path in sorted(members):
+                    if path is None:
+                        info = tarfile.TarInfo(arcname)
+                        info.type = tarfile.DIRTYPE
+                        info.mode = 0o755
+                        tar.addfile(info)
+                        continue
+                    with open(path, 'rb') as f:
+                        tar.addfile(_tar_info(tar, path, arcname), f)
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def manifest_path(model_dir):
+    return os.path.normpath(model_dir) + MANIFEST_SUFFIX
+
+
+def load_manifest(model_dir):
+    path = manifest_path(model_dir)
+    if not os.path.isfile(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(model_dir, manifest):
+    with open(manifest_path(model_dir), 'w') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+
+
+class S3Store(object):
+    """Model bucket, the archive sha256 is kept in the object metadata."""
+
+    def __init__(self, s3_client, bucket):
+        self.s3_client = s3_client
+        self.bucket = bucket
+
+    def get_sha256(self, key):
+        try:
+            response = self.s3_client.head_object(Bucket=self.bucket, Key=key)
+        except self.s3_client.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return response.get('Metadata', {}).get(SHA256_METADATA)
+
+    def upload(self, path, key, sha256):
+        self.s3_client.upload_file(path, self.bucket, key, ExtraArgs={'Metadata': {SHA256_METADATA: sha256}})
+
+    def copy(self, source_key, key, sha256):
+        self.s3_client.copy_object(Bucket=self.bucket, Key=key,
+                                   CopySource={'Bucket': self.bucket, 'Key': source_key},
+                                   Metadata={SHA256_METADATA: sha256}, MetadataDirective='REPLACE')
+
+
+class LocalStore(object):
+    """Local filesystem stand-in for S3Store, the sha256 is kept in a sidecar file."""
+
+    def __init__(self, root):
+        self.root = root
+        self.uploads = 0
+        self.copies = 0
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def get_sha256(self, key):
+        path = self._path(key) + '.' + SHA256_METADATA
+        if not os.path.isfile(self._path(key)) or not os.path.isfile(path):
+            return None
+        with open(path, 'r') as f:
+            return f.read().strip()
+
+    def _put(self, source_path, key, sha256):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(source_path, path)
+        with open(path + '.' + SHA256_METADATA, 'w') as f:
+            f.write(sha256)
+
+    def upload(self, path, key, sha256):
+        self.uploads += 1
+        self._put(path, key, sha256)
+
+    def copy(self, source_key, key, sha256):
+        self.copies += 1
+        self._put(self._path(source_key), key, sha256)
+
+
+def prepare_model_src(model_src, vocab_index=False, export_format=None, quantize='none'):
+    """Regenerate the optional artifacts(vocab.idx, model.pt/model_state.pth) as pack_models.sh did."""
+    for name in ['model.pt', 'model_state.pth']:
+        path = os.path.join(model_src, name)
+        if os.path.isfile(path):
+            os.remove(path)
+    if export_format:
+        sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+        from export_model import export_model
+        export_model(model_src, export_format, quantize)
+
+    vocab_idx_path = os.path.join(model_src, 'vocab.idx')
+    if vocab_index:
+        # vocab_index.py writes the same bytes for the same vocab.pth, so the hash is stable
+        subprocess.check_call([sys.executable, 'code/vocab_index.py', 'vocab.pth', 'vocab.idx'], cwd=model_src)
+    elif os.path.isfile(vocab_idx_path):
+        os.remove(vocab_idx_path)
+
+
+def pack_model(model_dir, model_src, compression='gzip', common_dir=COMMON_DIR, force=False):
+    """Build model_dir/model.tar.gz unless the inputs are unchanged since the last build."""
+    timings = {}
+
+    start = time.time()
+    inputs = collect_inputs(model_src, common_dir)
+    input_hash = compute_input_hash(inputs, compression)
+    timings['hash_ms'] = (time.time() - start) * 1000
+
+    archive_path = os.path.join(model_dir, MODEL_FILE)
+    manifest = load_manifest(model_dir)
+    rebuilt = force or manifest.get('input_sha256') != input_hash \
+        or not os.path.isfile(archive_path) or file_sha256(archive_path) != manifest.get('archive_sha256')
+
+    start = time.time()
+    if rebuilt:
+        os.makedirs(model_dir, exist_ok=True)
+        build_archive(inputs, archive_path, compression)
+        manifest = {
+            'input_sha256': input_hash,
+            'archive_sha256': file_sha256(archive_path),
+            'compression': compression,
+            'files': [arcname for arcname, _ in inputs]
+        }
+        save_manifest(model_dir, manifest)
+    timings['build_ms'] = (time.time() - start) * 1000
+
+    return {
+        'model_dir': model_dir,
+        'archive_path': archive_path,
+        'archive_sha256': manifest['archive_sha256'],
+        'archive_bytes': os.path.getsize(archive_path),
+        'rebuilt': rebuilt,
+        'timings': timings
+    }
+
+
+def upload_models(store, packed_list, model_list):
+    """Upload each ModelS3Key once per distinct archive: skip matching keys, copy duplicates."""
+    packed_by_dir = dict((os.path.normpath(packed['model_dir']), packed) for packed in packed_list)
+    uploaded_keys = {}
+    results = []
+
+    for model in model_list:
+        packed = packed_by_dir[os.path.normpath(model['ModelLocalPath'])]
+        sha256 = packed['archive_sha256']
+        key = '{}/{}'.format(model['ModelS3Key'].rstrip('/'), MODEL_FILE)
+
+        start = time.time()
+        if store.get_sha256(key) == sha256:
+            action = 'skipped'
+        elif sha256 in uploaded_keys:
+            store.copy(uploaded_keys[sha256], key, sha256)
+            action = 'copied'
+        else:
+            store.upload(packed['archive_path'], key, sha256)
+            action = 'uploaded'
+        uploaded_keys.setdefault(sha256, key)
+
+        results.append({
+            'key': key,
+            'sha256': sha256,
+            'action': action,
+            'bytes': packed['archive_bytes'] if action == 'uploaded' else 0,
+            'upload_ms': (time.time() - start) * 1000
+        })
+    return results
+
+
+def pack_models(model_list, compression='gzip', store=None, vocab_index=False, export_format=None,
+                quantize='none', common_dir=COMMON_DIR, force=False):
+    packed_list = []
+    for model_dir in sorted(set(os.path.normpath(model['ModelLocalPath']) for model in model_list)):
+        model_src = os.path.join(os.path.dirname(model_dir), 'src')
+        prepare_model_src(model_src, vocab_index, export_format, quantize)
+        packed_list.append(pack_model(model_dir, model_src, compression, common_dir, force))
+
+    uploads = upload_models(store, packed_list, model_list) if store is not None else []
+
+    report = {
+        'Compression': compression,
+        'Models': packed_list,
+        'Uploads': uploads,
+        'Rebuilt': sum(1 for packed in packed_list if packed['rebuilt']),
+        'UploadedBytes': sum(upload['bytes'] for upload in uploads),
+        'HashMs': sum(packed['timings']['hash_ms'] for packed in packed_list),
+        'BuildMs': sum(packed['timings']['build_ms'] for packed in packed_list),
+        'UploadMs': sum(upload['upload_ms'] for upload in uploads)
+    }
+    return report
+
+
+def load_model_list(config_path, model_root=None):
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    model_list = config['Stack']['ModelArchiving']['ModelList']
+    if model_root is not None:
+        model_list = [model for model in model_list
+                      if os.path.normpath(os.path.dirname(model['ModelLocalPath'])) == os.path.normpath(model_root)]
+        if len(model_list) == 0:
+            raise Exception('pack_models: no ModelList entry under ' + model_root)
+    return model_list
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', default='config/app-config.json')
+    parser.add_argument('--model-root', default=None, help='pack only this model, e.g. models/model-a')
+    parser.add_argument('--compression', default='gzip', choices=sorted(COMPRESSION_LEVELS.keys()))
+    parser.add_argument('--vocab-index', action='store_true')
+    parser.add_argument('--export-format', default=None, choices=['torchscript', 'state_dict'])
+    parser.add_argument('--quantize', default='none', choices=['none', 'linear', 'all'])
+    parser.add_argument('--bucket', default=None, help='upload into this model bucket')
+    parser.add_argument('--profile', default=None)
+    parser.add_argument('--local-store', default=None, help='upload into this directory instead of S3')
+    parser.add_argument('--force', action='store_true', help='rebuild even if the inputs are unchanged')
+    args = parser.parse_args()
+
+    store = None
+    if args.local_store is not None:
+        store = LocalStore(args.local_store)
+    elif args.bucket is not None:
+        import boto3
+        session = boto3.Session(profile_name=args.profile)
+        store = S3Store(session.client('s3'), args.bucket)
+
+    report = pack_models(load_model_list(args.config, args.model_root), args.compression, store,
+                         args.vocab_index, args.export_format, args.quantize, force=args.force)
+
+    for packed in report['Models']:
+        print('[INFO] {} {}: {} bytes, sha256 {}'.format('built' if packed['rebuilt'] else 'unchanged',
+                                                          packed['archive_path'], packed['archive_bytes'],
+                                                          packed['archive_sha256'][:12]))
+    for upload in report['Uploads']:
+        print('[INFO] {} {}'.format(upload['action'], upload['key']))
+    print('[INFO] rebuilt {}/{}, uploaded {} bytes, hash {:.1f}ms, build {:.1f}ms, upload {:.1f}ms'.format(
+        report['Rebuilt'], len(report['Models']), report['UploadedBytes'],
+        report['HashMs'], report['BuildMs'], report['UploadMs']))
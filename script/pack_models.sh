@@ -3,21 +3,22 @@
 MODEL_ROOT=models/model-a
 # MODEL_ROOT=models/model-b
 
-MODEL_FILE=model.tar.gz
-MODEL_DIR=model
-SRC_DIR=src
+# set VOCAB_INDEX=true to convert vocab.pth into a memory-mapped vocab.idx shared by all model server workers
+VOCAB_INDEX=${VOCAB_INDEX:-false}
+# set EXPORT_FORMAT=torchscript(or state_dict) to ship a faster-loading model artifact next to model.pth
+EXPORT_FORMAT=${EXPORT_FORMAT:-}
+# set QUANTIZE=linear(or all) to export a dynamic int8 quantized TorchScript model
+QUANTIZE=${QUANTIZE:-none}
+# set COMPRESSION=gzip-fast(or none) to trade archive size for packing and container start time
+COMPRESSION=${COMPRESSION:-gzip}
 
-echo ==--------RemoveOldModelDir---------==
-if [ -f "$MODEL_ROOT/$MODEL_DIR/$MODEL_FILE" ]; then
-    rm -r "$MODEL_ROOT/$MODEL_DIR/$MODEL_FILE"
+ARGS="--model-root $MODEL_ROOT --compression $COMPRESSION --quantize $QUANTIZE"
+if [ "$VOCAB_INDEX" = "true" ]; then
+    ARGS="$ARGS --vocab-index"
 fi
-
-echo ==--------PackNewModel---------==
-cd "$MODEL_ROOT"/"$SRC_DIR"
-if [ -f "$MODEL_FILE" ]; then
-    rm $MODEL_FILE
+if [ -n "$EXPORT_FORMAT" ]; then
+    ARGS="$ARGS --export-format $EXPORT_FORMAT"
 fi
-tar -zcvf $MODEL_FILE ./*
 
-echo ==--------MoveIntoModelDir---------==
-mv $MODEL_FILE ../"$MODEL_DIR"
+echo ==--------PackModel---------==
+python3 script/pack_models.py $ARGS "$@"